@@ -0,0 +1,510 @@
+"""
+消息归档
+转发的消息按批压缩后追加写入分段文件，每个分段有一个按 (群组, 发送者, 时间) 排列的定长索引，
+可选的 SQLite FTS5 全文索引用于按内容搜索。写入由消息输出的后台线程批量完成，不占用事件循环；
+查询时通过 mmap 读取索引和分段文件，只解压命中的数据块。
+
+目录结构:
+    seg-000001.dat   压缩的数据块，每块为一批记录（每行一条JSON）
+    seg-000001.idx   正在写入的分段的索引，按写入顺序排列
+    seg-000001.sidx  已写满的分段的索引，按 (群组, 发送者, 时间) 排序，查询时二分查找
+    fts.sqlite3      全文索引（可选）
+
+用法:
+    python archive.py query --group -1001234567890 --sender 123456789 --since 7d
+    python archive.py query --text 空投 --limit 20
+    python archive.py stats
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+from sink import MessageSink
+
+logger = logging.getLogger(__name__)
+
+BLOCK_HEADER = struct.Struct(">II")       # 压缩后的长度, 记录数量
+INDEX_ENTRY = struct.Struct(">QQQQI")     # 群组, 发送者, 时间, 数据块偏移, 块内序号
+ID_FIELD = struct.Struct(">Q")
+# 有符号的ID加上偏移后按无符号大端存储，索引项的字节顺序与 (群组, 发送者, 时间) 的数值顺序一致
+ID_OFFSET = 1 << 63
+
+FTS_FILE = "fts.sqlite3"
+FTS_MIN_QUERY = 3  # trigram 分词器只能匹配至少3个字符的查询，更短的查询逐条比对
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5(text, content='', tokenize='trigram');
+CREATE TABLE IF NOT EXISTS locations (
+    id INTEGER PRIMARY KEY,
+    segment INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    pos INTEGER NOT NULL,
+    date INTEGER NOT NULL,
+    group_id INTEGER NOT NULL,
+    sender_id INTEGER NOT NULL
+);
+"""
+
+
+def encode_id(value):
+    return (value or 0) + ID_OFFSET
+
+
+def decode_id(value):
+    return value - ID_OFFSET
+
+
+def segment_path(directory, number, ext):
+    return os.path.join(directory, f"seg-{number:06d}{ext}")
+
+
+def list_segments(directory):
+    """
+    返回目录中的分段编号（升序）
+    """
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted({int(name[4:10]) for name in names if name.startswith("seg-") and name.endswith(".dat")})
+
+
+def record_timestamp(record):
+    """
+    消息的发送时间（Unix时间戳，秒），没有时为0
+    """
+    date = record["message"].get("date")
+    return int(datetime.fromisoformat(date).timestamp()) if date else 0
+
+
+def open_fts(path):
+    """
+    打开全文索引，SQLite 不支持 FTS5 或 trigram 分词器时返回None
+    """
+    db = sqlite3.connect(path)
+    # 与发件箱相同，WAL 模式下每批只需一次追加写入
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    try:
+        db.executescript(FTS_SCHEMA)
+    except sqlite3.OperationalError as e:
+        db.close()
+        logger.warning(f"SQLite 不支持 FTS5 trigram 全文索引，按内容搜索时逐条比对: {e}")
+        return None
+    return db
+
+
+class ArchiveSink(MessageSink):
+    """
+    把消息写入归档目录，每批记录压缩为一个数据块
+    """
+    name = "archive"
+
+    def __init__(self, directory, segment_messages=100000, compress_level=6, fts=True, **kwargs):
+        """
+        Args:
+            directory (str): 归档目录
+            segment_messages (int): 每个分段最多的消息数量，写满后排序索引并开始新的分段
+            compress_level (int): zlib 压缩级别
+            fts (bool): 是否建立全文索引
+        """
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.segment_messages = segment_messages
+        self.compress_level = compress_level
+        self.fts = fts
+        self._segment = None
+        self._count = 0
+        self._dat = None
+        self._idx = None
+        self._db = None
+
+    def _open(self):
+        """
+        打开最后一个未写满的分段继续追加，没有时新建分段
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        segments = list_segments(self.directory)
+        last = segments[-1] if segments else 0
+        idx_path = segment_path(self.directory, last, ".idx")
+        if last and os.path.exists(idx_path):
+            # 丢弃上次异常退出时写了一半的索引项
+            size = os.path.getsize(idx_path)
+            if size % INDEX_ENTRY.size:
+                os.truncate(idx_path, size - size % INDEX_ENTRY.size)
+            self._segment = last
+            self._count = size // INDEX_ENTRY.size
+        else:
+            self._segment = last + 1
+            self._count = 0
+        self._open_segment()
+        if self._count >= self.segment_messages:
+            self._seal()
+        if self.fts and self._db is None:
+            self._db = open_fts(os.path.join(self.directory, FTS_FILE))
+            self.fts = self._db is not None
+
+    def _open_segment(self):
+        self._dat = open(segment_path(self.directory, self._segment, ".dat"), "ab")
+        self._idx = open(segment_path(self.directory, self._segment, ".idx"), "ab")
+
+    def _write_batch(self, records):
+        if self._dat is None:
+            self._open()
+        start = 0
+        while start < len(records):
+            chunk = records[start:start + self.segment_messages - self._count]
+            self._append_block(chunk)
+            start += len(chunk)
+            if self._count >= self.segment_messages:
+                self._seal()
+
+    def _append_block(self, records):
+        data = zlib.compress("\n".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) for record in records
+        ).encode("utf-8"), self.compress_level)
+        offset = self._dat.tell()
+        self._dat.write(BLOCK_HEADER.pack(len(data), len(records)))
+        self._dat.write(data)
+        self._dat.flush()
+
+        # 数据块写入后再写索引，异常退出时索引不会指向不完整的数据块
+        entries = []
+        locations = []
+        for pos, record in enumerate(records):
+            group_id = record["group"]["id"]
+            sender_id = record["sender"]["id"] or 0
+            date = record_timestamp(record)
+            entries.append(INDEX_ENTRY.pack(encode_id(group_id), encode_id(sender_id), date, offset, pos))
+            locations.append((self._segment, offset, pos, date, group_id, sender_id, record["message"]["text"] or ""))
+        self._idx.write(b"".join(entries))
+        self._idx.flush()
+        self._count += len(records)
+
+        if self._db is not None:
+            with self._db:
+                for location in locations:
+                    row_id = self._db.execute(
+                        "INSERT INTO locations (segment, block, pos, date, group_id, sender_id) VALUES (?, ?, ?, ?, ?, ?)",
+                        location[:6]
+                    ).lastrowid
+                    self._db.execute("INSERT INTO messages (rowid, text) VALUES (?, ?)", (row_id, location[6]))
+
+    def _seal(self):
+        """
+        分段写满后按 (群组, 发送者, 时间) 排序索引，并开始新的分段
+        """
+        self._dat.close()
+        self._idx.close()
+        idx_path = segment_path(self.directory, self._segment, ".idx")
+        sidx_path = segment_path(self.directory, self._segment, ".sidx")
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        size = INDEX_ENTRY.size
+        entries = sorted(data[i:i + size] for i in range(0, len(data), size))
+        with open(sidx_path + ".tmp", "wb") as f:
+            f.write(b"".join(entries))
+        os.replace(sidx_path + ".tmp", sidx_path)
+        os.remove(idx_path)
+        self._segment += 1
+        self._count = 0
+        self._open_segment()
+
+    def _close(self):
+        for f in (self._dat, self._idx):
+            if f is not None:
+                f.close()
+        self._dat = self._idx = None
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+
+def _map(path):
+    """
+    以只读方式映射文件，文件为空或不存在时返回None
+    """
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+
+
+def _bisect(buf, count, key):
+    """
+    在排序的索引中查找第一个前缀不小于 key 的索引项
+    """
+    size = INDEX_ENTRY.size
+    width = len(key)
+    lo, hi = 0, count
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = mid * size
+        if buf[start:start + width] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class ArchiveReader:
+    def __init__(self, directory):
+        """
+        Args:
+            directory (str): 归档目录
+        """
+        self.directory = directory
+        self._maps = {}
+        self._blocks = {}
+        self._db = None
+        fts_path = os.path.join(directory, FTS_FILE)
+        if os.path.exists(fts_path):
+            self._db = sqlite3.connect(f"file:{fts_path}?mode=ro", uri=True)
+
+    def close(self):
+        for mapped in self._maps.values():
+            if mapped is not None:
+                mapped.close()
+        self._maps.clear()
+        self._blocks.clear()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def query(self, group=None, sender=None, since=None, until=None, text=None, limit=50):
+        """
+        查询归档的消息，按时间从新到旧返回
+
+        Args:
+            group (int): 群组ID
+            sender (int): 发送者ID
+            since (int): 起始时间（Unix时间戳，包含）
+            until (int): 结束时间（Unix时间戳，包含）
+            text (str): 消息中包含的文字（不区分大小写）
+            limit (int): 最多返回的消息数量
+
+        Returns:
+            list: 消息记录（与消息输出的格式相同）
+        """
+        since = since or 0
+        until = until if until is not None else (1 << 64) - 1
+        if text and self._db is not None and len(text) >= FTS_MIN_QUERY:
+            locations = self._query_fts(group, sender, since, until, text, limit)
+            return [self._read_record(*location) for location in locations]
+
+        # 没有全文索引时先按索引筛选，再从新到旧逐条比对文字，直到凑够数量
+        candidates = self._query_index(group, sender, since, until)
+        if not text:
+            return [self._read_record(segment, block, pos) for _, segment, block, pos in heapq.nlargest(limit, candidates)]
+        needle = text.casefold()
+        results = []
+        for _, segment, block, pos in sorted(candidates, reverse=True):
+            record = self._read_record(segment, block, pos)
+            if needle in (record["message"]["text"] or "").casefold():
+                results.append(record)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def get_stats(self):
+        """
+        获取归档统计信息
+        """
+        segments = list_segments(self.directory)
+        messages = 0
+        data_bytes = 0
+        for number in segments:
+            data_bytes += os.path.getsize(segment_path(self.directory, number, ".dat"))
+            for ext in (".sidx", ".idx"):
+                path = segment_path(self.directory, number, ext)
+                if os.path.exists(path):
+                    messages += os.path.getsize(path) // INDEX_ENTRY.size
+        return {
+            "segments": len(segments),
+            "messages": messages,
+            "data_bytes": data_bytes,
+            "fts": self._db is not None,
+        }
+
+    def _mapped(self, path):
+        mapped = self._maps.get(path)
+        if mapped is None:
+            mapped = _map(path)
+            if mapped is not None:
+                self._maps[path] = mapped
+        return mapped
+
+    def _query_index(self, group, sender, since, until):
+        """
+        按索引筛选消息，返回 [(时间, 分段, 数据块偏移, 块内序号), ...]
+        """
+        group_key = ID_FIELD.pack(encode_id(group)) if group is not None else None
+        sender_enc = encode_id(sender) if sender is not None else None
+        size = INDEX_ENTRY.size
+        matches = []
+        for number in list_segments(self.directory):
+            sorted_index = True
+            buf = self._mapped(segment_path(self.directory, number, ".sidx"))
+            if buf is None:
+                # 正在写入的分段，索引按写入顺序排列，只能顺序扫描；不缓存映射，下次查询时能看到新写入的消息
+                sorted_index = False
+                buf = _map(segment_path(self.directory, number, ".idx"))
+                if buf is None:
+                    continue
+            count = len(buf) // size
+            start, end = 0, count
+            if sorted_index and group_key is not None:
+                prefix = group_key
+                if sender_enc is not None:
+                    prefix += ID_FIELD.pack(sender_enc)
+                    start = _bisect(buf, count, prefix + ID_FIELD.pack(since))
+                else:
+                    start = _bisect(buf, count, prefix)
+                end = _bisect(buf, count, _increment(prefix))
+            view = memoryview(buf)[start * size:end * size]
+            try:
+                for group_enc, entry_sender, date, block, pos in INDEX_ENTRY.iter_unpack(view):
+                    if date < since or date > until:
+                        continue
+                    if sender_enc is not None and entry_sender != sender_enc:
+                        continue
+                    if group_key is not None and not sorted_index and ID_FIELD.pack(group_enc) != group_key:
+                        continue
+                    matches.append((date, number, block, pos))
+            finally:
+                view.release()
+                if not sorted_index:
+                    buf.close()
+        return matches
+
+    def _query_fts(self, group, sender, since, until, text, limit):
+        sql = (
+            "SELECT l.segment, l.block, l.pos FROM messages m JOIN locations l ON l.id = m.rowid "
+            "WHERE m.text MATCH ? AND l.date BETWEEN ? AND ?"
+        )
+        params = ['"' + text.replace('"', '""') + '"', since, min(until, (1 << 63) - 1)]
+        if group is not None:
+            sql += " AND l.group_id = ?"
+            params.append(group)
+        if sender is not None:
+            sql += " AND l.sender_id = ?"
+            params.append(sender)
+        sql += " ORDER BY l.date DESC, l.id DESC LIMIT ?"
+        params.append(limit)
+        return self._db.execute(sql, params).fetchall()
+
+    def _read_record(self, segment, block, pos):
+        key = (segment, block)
+        lines = self._blocks.get(key)
+        if lines is None:
+            path = segment_path(self.directory, segment, ".dat")
+            buf = self._mapped(path)
+            if not _has_block(buf, block):
+                # 正在写入的分段在映射之后又追加了数据块，重新映射
+                self._maps.pop(path).close()
+                buf = self._mapped(path)
+            length, _ = BLOCK_HEADER.unpack_from(buf, block)
+            start = block + BLOCK_HEADER.size
+            lines = zlib.decompress(buf[start:start + length]).split(b"\n")
+            self._blocks[key] = lines
+        return json.loads(lines[pos])
+
+
+def _has_block(buf, offset):
+    if offset + BLOCK_HEADER.size > len(buf):
+        return False
+    length, _ = BLOCK_HEADER.unpack_from(buf, offset)
+    return offset + BLOCK_HEADER.size + length <= len(buf)
+
+
+def _increment(prefix):
+    """
+    返回比所有以 prefix 开头的字节串都大的最小字节串（prefix 为若干个8字节ID）
+    """
+    value = int.from_bytes(prefix, "big") + 1
+    return value.to_bytes(len(prefix), "big")
+
+
+def parse_time(value, end=False):
+    """
+    解析命令行中的时间：2026-10-01、2026-10-01T12:00、7d（7天前）、12h（12小时前）
+
+    Args:
+        end (bool): 是否为结束时间，只有日期时取当天最后一秒
+    """
+    if value is None:
+        return None
+    units = {"d": 86400, "h": 3600, "m": 60}
+    if value[-1:] in units and value[:-1].isdigit():
+        return int(time.time()) - int(value[:-1]) * units[value[-1]]
+    moment = datetime.fromisoformat(value)
+    if end and len(value) == 10:
+        moment += timedelta(days=1, seconds=-1)
+    return int(moment.timestamp())
+
+
+def format_record(record):
+    message = record["message"]
+    date = datetime.fromisoformat(message["date"]).astimezone().strftime("%Y-%m-%d %H:%M:%S") if message["date"] else "-"
+    edited = " (已修改)" if message["is_edited"] else ""
+    media = f"[{message['media']['type']}] " if message.get("media") else ""
+    return f"{date}  {record['group']['title']}  {record['sender']['full_name']}{edited}: {media}{message['text'] or ''}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="查询归档的消息")
+    parser.add_argument("--dir", default=None, help="归档目录，默认使用 config.py 中的 ARCHIVE_DIR")
+    commands = parser.add_subparsers(dest="command", required=True)
+    query = commands.add_parser("query", help="按群组、发送者、时间和内容查询消息")
+    query.add_argument("--group", type=int, help="群组ID")
+    query.add_argument("--sender", type=int, help="发送者ID")
+    query.add_argument("--since", help="起始时间，例如 2026-10-01 或 7d")
+    query.add_argument("--until", help="结束时间，例如 2026-10-07")
+    query.add_argument("--text", help="消息中包含的文字")
+    query.add_argument("--limit", type=int, default=50, help="最多返回的消息数量")
+    query.add_argument("--json", action="store_true", help="每行输出一条JSON记录")
+    commands.add_parser("stats", help="显示归档统计信息")
+    args = parser.parse_args()
+
+    directory = args.dir
+    if directory is None:
+        from config import ARCHIVE_DIR
+        directory = ARCHIVE_DIR
+
+    reader = ArchiveReader(directory)
+    try:
+        if args.command == "stats":
+            print(json.dumps(reader.get_stats(), ensure_ascii=False))
+            return
+        started = time.perf_counter()
+        records = reader.query(
+            group=args.group,
+            sender=args.sender,
+            since=parse_time(args.since),
+            until=parse_time(args.until, end=True),
+            text=args.text,
+            limit=args.limit
+        )
+        elapsed = time.perf_counter() - started
+        for record in records:
+            print(json.dumps(record, ensure_ascii=False) if args.json else format_record(record))
+        print(f"共 {len(records)} 条，用时 {elapsed * 1000:.1f} ms", file=sys.stderr)
+    finally:
+        reader.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+消息归档基准测试
+生成大量合成消息写入临时归档目录，测量写入速度、压缩后的大小，
+以及按群组/发送者/时间和按内容查询的耗时（查询结果与逐条比对的结果一致）
+
+用法:
+    python benchmarks/bench_archive.py
+    python benchmarks/bench_archive.py --messages 2000000 --no-fts
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from archive import ArchiveSink, ArchiveReader
+
+WORDS = ["空投", "公告", "上线", "活动", "奖励", "airdrop", "listing", "token", "今天", "明天", "注意", "更新",
+         "价格", "合约", "钱包", "交易", "社区", "投票", "质押", "快照", "hello", "world", "meeting", "release"]
+
+
+def make_records(rng, count, groups, senders, start, span):
+    """
+    生成按时间递增的合成消息记录
+    """
+    step = span / count
+    for i in range(count):
+        group_id = -1001000000000 - rng.randrange(groups)
+        sender_id = 1000 + rng.randrange(senders)
+        date = datetime.fromtimestamp(start + int(i * step), timezone.utc).isoformat()
+        yield {
+            "timestamp": date,
+            "group": {"id": group_id, "title": f"群组{-group_id % 1000}"},
+            "sender": {"id": sender_id, "first_name": f"用户{sender_id}", "last_name": None,
+                       "username": None, "full_name": f"用户{sender_id}"},
+            "message": {"id": i + 1, "text": " ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 20))),
+                        "date": date, "edited": None, "is_edited": False, "media": None},
+        }
+
+
+def timed(func, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="消息归档基准测试")
+    parser.add_argument("--messages", type=int, default=1000000, help="消息数量")
+    parser.add_argument("--groups", type=int, default=20, help="群组数量")
+    parser.add_argument("--senders", type=int, default=500, help="发送者数量")
+    parser.add_argument("--batch", type=int, default=200, help="每个数据块的记录数量")
+    parser.add_argument("--segment-messages", type=int, default=100000, help="每个分段的消息数量")
+    parser.add_argument("--no-fts", action="store_true", help="不建立全文索引")
+    parser.add_argument("--check", type=int, default=200000, help="用逐条比对验证查询结果的消息数量上限，0表示不验证")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    directory = tempfile.mkdtemp(prefix="archive_bench_")
+    try:
+        end = int(time.time())
+        start = end - 30 * 86400
+        sink = ArchiveSink(directory, segment_messages=args.segment_messages, fts=not args.no_fts)
+        kept = [] if args.messages <= args.check else None
+
+        started = time.perf_counter()
+        batch = []
+        for record in make_records(rng, args.messages, args.groups, args.senders, start, end - start):
+            batch.append(record)
+            if kept is not None:
+                kept.append(record)
+            if len(batch) >= args.batch:
+                sink._write_batch(batch)
+                batch = []
+        if batch:
+            sink._write_batch(batch)
+        sink._close()
+        write_elapsed = time.perf_counter() - started
+
+        reader = ArchiveReader(directory)
+        stats = reader.get_stats()
+        print(f"写入 {stats['messages']} 条消息: {write_elapsed:.1f} 秒 ({stats['messages'] / write_elapsed:.0f} 条/秒), "
+              f"{stats['segments']} 个分段, 数据 {stats['data_bytes'] / 1024 / 1024:.1f} MB"
+              f" ({stats['data_bytes'] / stats['messages']:.0f} 字节/条), 全文索引: {stats['fts']}")
+
+        group = -1001000000000 - 3
+        sender = 1000 + 42
+        week_ago = end - 7 * 86400
+        queries = [
+            ("群组", dict(group=group)),
+            ("群组+发送者", dict(group=group, sender=sender)),
+            ("群组+发送者+最近一周", dict(group=group, sender=sender, since=week_ago)),
+            ("发送者+最近一周", dict(sender=sender, since=week_ago)),
+            ("内容", dict(text="airdrop listing")),
+            ("群组+内容+最近一周", dict(group=group, text="空投 公告", since=week_ago)),
+        ]
+        print(f"{'查询':20}{'耗时(ms)':>12}{'结果':>8}")
+        for name, kwargs in queries:
+            elapsed, records = timed(lambda: reader.query(limit=50, **kwargs))
+            print(f"{name:20}{elapsed * 1000:>12.1f}{len(records):>8}")
+            if kept is not None:
+                assert [r["message"]["id"] for r in records] == naive_query(kept, limit=50, **kwargs), name
+        reader.close()
+        if kept is not None:
+            print("查询结果与逐条比对一致")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def naive_query(records, group=None, sender=None, since=None, text=None, limit=50):
+    matched = [
+        r for r in records
+        if (group is None or r["group"]["id"] == group)
+        and (sender is None or r["sender"]["id"] == sender)
+        and (since is None or datetime.fromisoformat(r["message"]["date"]).timestamp() >= since)
+        and (text is None or text.casefold() in r["message"]["text"].casefold())
+    ]
+    return [r["message"]["id"] for r in reversed(matched)][:limit]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+内容过滤微基准测试
+比较逐条匹配每个关键词/正则与编译后的 RuleSet（Aho-Corasick 自动机 + 合并的正则）在大量规则下的匹配耗时
+
+用法:
+    python benchmarks/bench_content_filter.py
+    python benchmarks/bench_content_filter.py --keywords 5000 --regex 500 --messages 2000
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_filter import RuleSet
+
+ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+CJK = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联什认六共权收证改清己美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专状育厂京识适属圆包火住调满县局照参红细引听该铁价严"
+
+
+def random_word(rng, min_len=2, max_len=6):
+    chars = ALPHABET if rng.random() < 0.5 else CJK
+    return "".join(rng.choice(chars) for _ in range(rng.randint(min_len, max_len)))
+
+
+def make_rules(rng, keyword_count, regex_count):
+    keywords = list({random_word(rng, 3, 8) for _ in range(keyword_count)})
+    patterns = [rf"\b{random_word(rng, 3, 6)}\d{{2,4}}\b" for _ in range(regex_count)]
+    return keywords, patterns
+
+
+def make_messages(rng, count, keywords, hit_ratio):
+    messages = []
+    for _ in range(count):
+        words = [random_word(rng, 1, 6) for _ in range(rng.randint(5, 60))]
+        if rng.random() < hit_ratio:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        messages.append(" ".join(words))
+    return messages
+
+
+def naive_matcher(keywords, patterns):
+    """
+    逐条匹配：每条消息依次检查每个关键词和每个正则
+    """
+    folded_keywords = [k.casefold() for k in keywords]
+    compiled = [re.compile(p, re.IGNORECASE) for p in patterns]
+
+    def matches(text):
+        folded = text.casefold()
+        return any(k in folded for k in folded_keywords) or any(p.search(text) for p in compiled)
+    return matches
+
+
+def measure(func, messages, repeat):
+    """
+    返回单条消息的平均匹配耗时（微秒）
+    """
+    def run():
+        for text in messages:
+            func(text)
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(messages) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="内容过滤微基准测试")
+    parser.add_argument("--keywords", type=int, default=3000, help="关键词数量")
+    parser.add_argument("--regex", type=int, default=300, help="正则表达式数量")
+    parser.add_argument("--messages", type=int, default=1000, help="测试消息数量")
+    parser.add_argument("--hit-ratio", type=float, default=0.1, help="包含关键词的消息比例")
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数，取最快一轮")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    keywords, patterns = make_rules(rng, args.keywords, args.regex)
+    messages = make_messages(rng, args.messages, keywords, args.hit_ratio)
+
+    start = timeit.default_timer()
+    naive = naive_matcher(keywords, patterns)
+    naive_build = timeit.default_timer() - start
+
+    start = timeit.default_timer()
+    rules = RuleSet(include_keywords=keywords, include_regex=patterns)
+    compiled_build = timeit.default_timer() - start
+
+    results = [rules.matches(text) for text in messages]
+    assert results == [naive(text) for text in messages]
+
+    naive_time = measure(naive, messages, args.repeat)
+    compiled_time = measure(rules.matches, messages, args.repeat)
+
+    avg_len = sum(map(len, messages)) / len(messages)
+    print(f"关键词: {len(keywords)}, 正则: {len(patterns)}, 消息: {len(messages)} (平均 {avg_len:.0f} 字符, 命中 {sum(results)})")
+    print(f"{'':12}{'构建耗时(ms)':>14}{'单条匹配(us)':>14}")
+    print(f"{'逐条匹配':12}{naive_build * 1000:>14.2f}{naive_time:>14.1f}")
+    print(f"{'RuleSet':12}{compiled_build * 1000:>14.2f}{compiled_time:>14.1f}")
+    print(f"匹配加速: {naive_time / compiled_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
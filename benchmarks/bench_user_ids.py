@@ -0,0 +1,102 @@
+"""
+用户ID匹配微基准测试
+比较原来的列表线性查找与 IntervalSet 二分查找的内存占用和单次查找耗时
+
+用法:
+    python benchmarks/bench_user_ids.py
+    python benchmarks/bench_user_ids.py --spec "100000-9000000" --lookups 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from interval_set import IntervalSet
+
+
+def parse_as_list(spec):
+    """
+    原 parse_input_ids 的行为：把范围展开成列表
+    """
+    ids = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part.isdigit():
+            ids.append(int(part))
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+            ids.extend(range(start, end + 1))
+    return ids
+
+
+def parse_as_interval_set(spec):
+    intervals = []
+    for part in spec.split(','):
+        part = part.strip()
+        if part.isdigit():
+            intervals.append((int(part), int(part)))
+        elif '-' in part:
+            start, end = map(int, part.split('-'))
+            intervals.append((start, end))
+    return IntervalSet(intervals)
+
+
+def measure_build(func, spec):
+    """
+    返回 (结果, 构建耗时秒, 峰值内存字节)
+    """
+    tracemalloc.start()
+    start = timeit.default_timer()
+    result = func(spec)
+    elapsed = timeit.default_timer() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def measure_lookup(container, probes, repeat):
+    """
+    返回单次成员判断的平均耗时（微秒）
+    """
+    def run():
+        for value in probes:
+            value in container
+    best = min(timeit.repeat(run, number=1, repeat=repeat))
+    return best / len(probes) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用户ID匹配微基准测试")
+    parser.add_argument("--spec", default="100000-1100000, 123456789, 987654321, 2000000-2000100",
+                        help="用户ID输入，格式与程序中输入的用户ID相同")
+    parser.add_argument("--lookups", type=int, default=100, help="每轮查找次数（列表查找很慢，不宜过大）")
+    parser.add_argument("--repeat", type=int, default=3, help="重复轮数，取最快一轮")
+    args = parser.parse_args()
+
+    as_list, list_build, list_mem = measure_build(parse_as_list, args.spec)
+    as_set, set_build, set_mem = measure_build(parse_as_interval_set, args.spec)
+
+    # 一半命中一半未命中；未命中的值需要扫描整个列表，是列表查找的最坏情况
+    rng = random.Random(0)
+    probes = [rng.choice(as_list) for _ in range(args.lookups // 2)]
+    probes += [-rng.randint(1, 10 ** 9) for _ in range(args.lookups - len(probes))]
+    assert all((p in as_list) == (p in as_set) for p in probes)
+
+    list_lookup = measure_lookup(as_list, probes, args.repeat)
+    set_lookup = measure_lookup(as_set, probes, args.repeat)
+
+    print(f"输入: {args.spec}")
+    print(f"ID数量: {len(as_set)}, 合并后区间数量: {len(as_set.intervals())}")
+    print(f"{'':12}{'构建耗时(ms)':>14}{'峰值内存(KB)':>14}{'单次查找(us)':>14}")
+    print(f"{'list':12}{list_build * 1000:>14.2f}{list_mem / 1024:>14.1f}{list_lookup:>14.3f}")
+    print(f"{'IntervalSet':12}{set_build * 1000:>14.2f}{set_mem / 1024:>14.1f}{set_lookup:>14.3f}")
+    print(f"查找加速: {list_lookup / set_lookup:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
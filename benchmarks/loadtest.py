@@ -0,0 +1,560 @@
+"""
+转发流程压测工具
+用合成的（或录制的）NewMessage / MessageEdited 事件按指定速率驱动 TelegramMonitor 的处理流程，
+QQ消息发送到本地的 NapCat 替身（WebSocket，OneBot 11 动作格式），替身可以注入延迟和错误。
+输出吞吐量、端到端延迟（p50/p95/p99，从事件产生到 NapCat 确认）、事件循环延迟和内存增长，
+可以保存结果并与基线对比，不需要真实的 Telegram 账号和 QQ 机器人。
+
+依赖: telethon、websockets（ncatbot 的依赖），config.py 需要能正常导入
+
+用法:
+    python benchmarks/loadtest.py --rate 200 --duration 30
+    python benchmarks/loadtest.py --rate 500 --sink-latency 0.05 --sink-error-rate 0.01 --no-rate-limit
+    python benchmarks/loadtest.py --replay recorded.jsonl --rate 100
+    python benchmarks/loadtest.py --output baseline.json
+    python benchmarks/loadtest.py --baseline baseline.json
+    python benchmarks/loadtest.py --serve-sink --sink-port 3901   # 只运行 NapCat 替身
+"""
+
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import types
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+
+# 每条合成消息的文本中都带有序号标记，NapCat 确认后据此计算端到端延迟（合并发送时一条QQ消息包含多个标记）
+MARKER_RE = re.compile(r"\[bench:(\d+)\]")
+
+
+# ========== NapCat 替身 ==========
+
+async def serve_napcat_standin(host, port, latency, jitter, error_rate, seed=0, ready=None):
+    """
+    运行 NapCat 替身：收到 send_group_msg 动作后等待注入的延迟再回复，按比例回复失败
+    """
+    rng = random.Random(seed)
+    message_ids = itertools.count(1)
+
+    async def respond(websocket, request):
+        delay = max(0.0, rng.gauss(latency, jitter)) if jitter else latency
+        await asyncio.sleep(delay)
+        if rng.random() < error_rate:
+            response = {"status": "failed", "retcode": 1200, "message": "injected error", "echo": request.get("echo")}
+        else:
+            response = {"status": "ok", "retcode": 0, "data": {"message_id": next(message_ids)}, "echo": request.get("echo")}
+        try:
+            await websocket.send(json.dumps(response))
+        except Exception:
+            pass
+
+    async def handler(websocket):
+        tasks = set()
+        async for raw in websocket:
+            task = asyncio.create_task(respond(websocket, json.loads(raw)))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+    async with serve(handler, host, port, max_size=None):
+        if ready is not None:
+            ready.set()
+        await asyncio.Future()
+
+
+def _run_sink_process(host, port, latency, jitter, error_rate, ready):
+    try:
+        asyncio.run(serve_napcat_standin(host, port, latency, jitter, error_rate, ready=ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class NapCatStandInAPI:
+    """
+    替代 bot.api 的客户端，通过 WebSocket 向 NapCat 替身发送 OneBot 动作并等待确认
+    """
+
+    def __init__(self, uri):
+        self.uri = uri
+        self._ws = None
+        self._reader = None
+        self._waiters = {}
+        self._echo = itertools.count(1)
+        self.on_ack = None  # 确认成功时调用，参数为发送的文本
+
+    async def connect(self):
+        self._ws = await connect(self.uri, max_size=None)
+        self._reader = asyncio.create_task(self._read_loop())
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _read_loop(self):
+        async for raw in self._ws:
+            response = json.loads(raw)
+            waiter = self._waiters.pop(response.get("echo"), None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(response)
+
+    async def post_group_msg(self, group_id, text=None, **kwargs):
+        echo = next(self._echo)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[echo] = waiter
+        await self._ws.send(json.dumps({
+            "action": "send_group_msg",
+            "params": {"group_id": group_id, "message": text},
+            "echo": echo,
+        }))
+        # 与 ncatbot 相同，失败时不抛出异常，直接返回 NapCat 的响应
+        response = await waiter
+        if response["status"] == "ok" and self.on_ack is not None:
+            self.on_ack(text)
+        return response
+
+
+def install_standin_bot(api):
+    """
+    用替身替换 ncatbot.core.BotClient，使 main 中的QQ机器人连接到 NapCat 替身
+    """
+    core = types.ModuleType("ncatbot.core")
+
+    class BotClient:
+        def __init__(self):
+            self.api = api
+
+        def run_blocking(self, **kwargs):
+            return self.api
+
+        def bot_exit(self):
+            pass
+
+    core.BotClient = BotClient
+    package = types.ModuleType("ncatbot")
+    package.core = core
+    sys.modules["ncatbot"] = package
+    sys.modules["ncatbot.core"] = core
+
+
+# ========== 模拟的 Telethon 事件 ==========
+
+class FakeMessage:
+    """
+    只包含处理流程用到的属性的 Telethon 消息替身
+    """
+
+    def __init__(self, chat_id, message_id, sender, text, date, edit_date=None):
+        self.chat_id = chat_id
+        self.id = message_id
+        self.sender = sender
+        self.sender_id = sender.id if sender is not None else None
+        self.text = text
+        self.date = date
+        self.edit_date = edit_date
+
+    async def get_sender(self):
+        return self.sender
+
+
+class FakeEvent:
+    def __init__(self, message):
+        self.message = message
+        self.chat_id = message.chat_id
+
+
+def synthetic_events(args, users):
+    """
+    生成合成事件: (是否编辑, 消息, 序号)
+    """
+    rng = random.Random(args.seed)
+    groups = [-1000000000000 - i for i in range(args.groups)]
+    next_message_id = {group_id: 1 for group_id in groups}
+    recent = []  # 最近的消息，用于生成编辑事件
+    seq = itertools.count(1)
+
+    while True:
+        group_id = rng.choice(groups)
+        watched = rng.random() < args.match_ratio
+        sender = rng.choice(users["watched"] if watched else users["other"])
+        n = next(seq)
+        now = datetime.now(timezone.utc)
+        if recent and rng.random() < args.edit_ratio:
+            original = rng.choice(recent)
+            message = FakeMessage(original.chat_id, original.id, original.sender,
+                                  f"编辑后的内容 [bench:{n}] " + "x" * args.text_size, original.date, now)
+            yield True, message, n
+            continue
+        message_id = next_message_id[group_id]
+        next_message_id[group_id] += 1
+        message = FakeMessage(group_id, message_id, sender, f"压测消息 [bench:{n}] " + "x" * args.text_size, now)
+        recent.append(message)
+        if len(recent) > 200:
+            recent.pop(0)
+        yield False, message, n
+
+
+def replay_events(path, users_by_id):
+    """
+    从 JSONL 文件回放事件，每行为 format_message_as_json 的输出
+    """
+    from telethon.tl.types import User
+
+    seq = itertools.count(1)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            sender_info = record.get("sender") or {}
+            sender_id = sender_info.get("id")
+            sender = users_by_id.get(sender_id)
+            if sender is None and sender_id is not None:
+                sender = User(id=sender_id, first_name=sender_info.get("first_name"),
+                              last_name=sender_info.get("last_name"), username=sender_info.get("username"))
+                users_by_id[sender_id] = sender
+            msg = record["message"]
+            n = next(seq)
+            now = datetime.now(timezone.utc)
+            message = FakeMessage(record["group"]["id"], msg["id"], sender,
+                                  f"{msg.get('text') or ''} [bench:{n}]", now,
+                                  now if msg.get("is_edited") else None)
+            yield bool(msg.get("is_edited")), message, n
+
+
+# ========== 测量 ==========
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def current_rss_kb():
+    """
+    当前进程的常驻内存（KB），不支持 /proc 时返回峰值
+    """
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+async def measure_loop_lag(samples, interval=0.01):
+    """
+    持续测量事件循环延迟：sleep 实际醒来的时间比预期晚多少
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append(time.perf_counter() - started - interval)
+
+
+# ========== 压测主流程 ==========
+
+async def run_load(args, api, workdir):
+    import main
+    from interval_set import IntervalSet
+    from telethon.tl.types import User
+
+    # 使用内存会话和临时文件，不影响正在运行的实例；压测不会连接Telegram，未配置API凭证时使用占位值
+    main.SESSION_NAME = None
+    main.API_ID = main.API_ID or 1
+    main.API_HASH = main.API_HASH or "0" * 32
+    main.OUTBOX_PATH = os.path.join(workdir, "outbox.sqlite3") if args.outbox else ""
+    main.CHECKPOINT_PATH = os.path.join(workdir, "checkpoints.json")
+    main.ENTITY_SNAPSHOT_PATH = os.path.join(workdir, "entity_snapshot.json")
+    main.OUTPUT_JSONL_PATH = os.path.join(workdir, "messages.jsonl")
+    main.ARCHIVE_DIR = os.path.join(workdir, "archive")
+    if args.no_debounce:
+        main.EDIT_DEBOUNCE_WINDOW = 0
+
+    if args.no_rate_limit:
+        main.QQ_SEND_RATE = 0
+
+    monitor = main.TelegramMonitor()
+
+    users = {
+        "watched": [User(id=1000 + i, first_name=f"用户{i}") for i in range(args.watched_users)],
+        "other": [User(id=900000 + i, first_name=f"路人{i}") for i in range(50)],
+    }
+    watched_ids = IntervalSet.from_ids(u.id for u in users["watched"])
+
+    if args.replay:
+        events = replay_events(args.replay, {u.id: u for u in users["watched"]})
+    else:
+        events = synthetic_events(args, users)
+
+    # 事件产生时间（序号 -> 时间），确认时计算延迟
+    created_at = {}
+    latencies = []
+    acked = [0, None]  # 确认数量, 最后一次确认时间
+
+    def on_ack(text):
+        now = time.perf_counter()
+        for match in MARKER_RE.finditer(text or ""):
+            started = created_at.pop(int(match.group(1)), None)
+            if started is not None:
+                latencies.append(now - started)
+                acked[0] += 1
+        acked[1] = now
+
+    api.on_ack = on_ack
+
+    lag_samples = []
+    lag_task = asyncio.create_task(measure_loop_lag(lag_samples))
+
+    group_titles = {}
+    produced = 0
+    matched = 0
+    rss_start = current_rss_kb()
+    started = time.perf_counter()
+
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        monitor.qq.start()
+        monitor.start_delivery()
+        if monitor.outbox is not None:
+            await monitor.outbox.start()
+        if monitor.edit_debouncer is not None:
+            monitor.edit_debouncer.start()
+        for sink in monitor.sinks:
+            sink.start()
+
+        interval = 1.0 / args.rate
+        next_at = time.perf_counter()
+        deadline = started + args.duration
+        for is_edited, message, n in events:
+            now = time.perf_counter()
+            if now >= deadline or (args.count and produced >= args.count):
+                break
+            if next_at > now:
+                await asyncio.sleep(next_at - now)
+            next_at += interval
+
+            if message.chat_id not in group_titles:
+                # 新群组加入路由表，所有群组共用同一份用户过滤条件
+                group_titles[message.chat_id] = f"压测群组 {message.chat_id}"
+                monitor.target_group_ids.append(message.chat_id)
+                monitor.target_user_ids[message.chat_id] = IntervalSet() if args.replay else watched_ids
+                monitor.build_routes(group_titles)
+
+            created_at[n] = time.perf_counter()
+            if monitor.match_route(message):
+                matched += 1
+            else:
+                created_at.pop(n)
+            produced += 1
+            event = FakeEvent(message)
+            await monitor._on_raw_update(event)
+            if is_edited:
+                await monitor._on_message_edited(event)
+            else:
+                await monitor._on_new_message(event)
+
+        produce_elapsed = time.perf_counter() - started
+
+        # 等待剩余消息发送完成
+        if monitor.edit_debouncer is not None:
+            await monitor.edit_debouncer.stop()
+        drain_deadline = time.perf_counter() + args.drain_timeout
+        if monitor.outbox is not None:
+            # 发件箱会重试失败的消息，等待全部完成
+            while time.perf_counter() < drain_deadline:
+                await asyncio.sleep(0.05)
+                if not monitor.outbox.get_stats()["in_flight"] and not any(q.depth for q in monitor.deliveries.values()):
+                    break
+        drain_timeout = max(0.1, drain_deadline - time.perf_counter())
+        queues = (*monitor.deliveries.values(), *monitor.media_deliveries.values())
+        await asyncio.gather(*(queue.stop(drain_timeout=drain_timeout) for queue in queues))
+        if monitor.outbox is not None:
+            await monitor.outbox.stop()
+        await monitor.qq.stop()
+        for sink in monitor.sinks:
+            await sink.stop()
+
+    lag_task.cancel()
+    rss_end = current_rss_kb()
+    end = acked[1] or time.perf_counter()
+    elapsed = end - started
+
+    return {
+        "config": {
+            "rate": args.rate,
+            "duration": args.duration,
+            "groups": args.groups,
+            "match_ratio": args.match_ratio,
+            "edit_ratio": args.edit_ratio,
+            "sink_latency": args.sink_latency,
+            "sink_error_rate": args.sink_error_rate,
+            "outbox": bool(args.outbox),
+            "rate_limit": bool(main.QQ_SEND_RATE),
+            "replay": args.replay,
+        },
+        "produced": produced,
+        "offered_rate": round(produced / produce_elapsed, 1) if produce_elapsed else None,
+        "matched": matched,
+        "delivered": acked[0],
+        "undelivered": len(created_at),
+        "throughput": round(acked[0] / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            name: round(percentile(latencies, p) * 1000, 2) if latencies else None
+            for name, p in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "loop_lag_ms": {
+            "p50": round(percentile(lag_samples, 0.50) * 1000, 2) if lag_samples else None,
+            "p99": round(percentile(lag_samples, 0.99) * 1000, 2) if lag_samples else None,
+            "max": round(max(lag_samples) * 1000, 2) if lag_samples else None,
+        },
+        "memory_kb": {"start": rss_start, "end": rss_end, "growth": rss_end - rss_start},
+        "delivery": monitor.get_delivery(monitor.qq_target_group).get_stats(),
+        "qq": monitor.qq.get_stats(),
+        "dedup": monitor.dedup.get_stats() if monitor.dedup is not None else None,
+        "outbox": monitor.outbox.get_stats() if monitor.outbox is not None else None,
+        "debounce": monitor.edit_debouncer.get_stats() if monitor.edit_debouncer is not None else None,
+        "output": {sink.name: sink.get_stats() for sink in monitor.sinks},
+        "stages": monitor.metrics.summary()["stage_seconds"],
+    }
+
+
+def print_report(result, baseline=None):
+    def fmt(value):
+        return "-" if value is None else str(value)
+
+    rows = [
+        ("产生事件", "produced"),
+        ("实际产生速率(/s)", "offered_rate"),
+        ("需要转发", "matched"),
+        ("已确认", "delivered"),
+        ("未确认(含被合并/失败)", "undelivered"),
+        ("吞吐量(/s)", "throughput"),
+        ("延迟 p50(ms)", ("latency_ms", "p50")),
+        ("延迟 p95(ms)", ("latency_ms", "p95")),
+        ("延迟 p99(ms)", ("latency_ms", "p99")),
+        ("事件循环延迟 p99(ms)", ("loop_lag_ms", "p99")),
+        ("事件循环延迟 max(ms)", ("loop_lag_ms", "max")),
+        ("内存增长(KB)", ("memory_kb", "growth")),
+    ]
+
+    def get(data, key):
+        if isinstance(key, tuple):
+            return (data.get(key[0]) or {}).get(key[1])
+        return data.get(key)
+
+    print("\n=== 压测结果 ===")
+    for label, key in rows:
+        line = f"{label:<22}{fmt(get(result, key)):>12}"
+        if baseline is not None:
+            old = get(baseline, key)
+            new = get(result, key)
+            line += f"{fmt(old):>12}"
+            if isinstance(old, (int, float)) and isinstance(new, (int, float)) and old:
+                line += f"{(new - old) / old * 100:>+10.1f}%"
+        print(line)
+    print(f"转发队列: {result['delivery']}")
+    if result.get("qq"):
+        print(f"QQ机器人: {result['qq']}")
+    if result.get("dedup"):
+        print(f"去重: {result['dedup']}")
+    if result["outbox"] is not None:
+        print(f"发件箱: {result['outbox']}")
+    if result["debounce"] is not None:
+        print(f"编辑防抖: {result['debounce']}")
+    for name, stats in (result.get("output") or {}).items():
+        print(f"消息输出 {name}: {stats}")
+
+
+async def async_main(args):
+    sink_process = None
+    uri = args.sink_uri
+    if uri is None:
+        # NapCat 替身运行在单独的进程中，不占用被测事件循环
+        ready = multiprocessing.Event()
+        sink_process = multiprocessing.Process(
+            target=_run_sink_process,
+            args=("127.0.0.1", args.sink_port, args.sink_latency, args.sink_jitter, args.sink_error_rate, ready),
+            daemon=True,
+        )
+        sink_process.start()
+        if not await asyncio.get_running_loop().run_in_executor(None, ready.wait, 10):
+            raise RuntimeError("NapCat 替身启动超时")
+        uri = f"ws://127.0.0.1:{args.sink_port}"
+
+    api = NapCatStandInAPI(uri)
+    install_standin_bot(api)
+    await api.connect()
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            return await run_load(args, api, workdir)
+    finally:
+        await api.close()
+        if sink_process is not None:
+            sink_process.terminate()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="转发流程压测工具")
+    parser.add_argument("--rate", type=float, default=100, help="每秒产生的事件数量")
+    parser.add_argument("--duration", type=float, default=10, help="产生事件的时长（秒）")
+    parser.add_argument("--count", type=int, default=0, help="最多产生的事件数量，0表示只按时长限制")
+    parser.add_argument("--groups", type=int, default=20, help="合成事件的群组数量")
+    parser.add_argument("--watched-users", type=int, default=20, help="每个群组监听的用户数量")
+    parser.add_argument("--match-ratio", type=float, default=0.3, help="来自监听用户的消息比例")
+    parser.add_argument("--edit-ratio", type=float, default=0.1, help="编辑事件比例")
+    parser.add_argument("--text-size", type=int, default=100, help="合成消息的附加文本长度")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="回放录制的事件（JSONL，每行为 format_message_as_json 的输出）")
+    parser.add_argument("--outbox", action="store_true", help="启用持久化发件箱（使用临时文件）")
+    parser.add_argument("--no-rate-limit", action="store_true", help="关闭QQ发送限速")
+    parser.add_argument("--no-debounce", action="store_true", help="关闭编辑消息防抖")
+    parser.add_argument("--drain-timeout", type=float, default=30, help="产生结束后等待发送完成的最长时间（秒）")
+    parser.add_argument("--sink-uri", help="使用已运行的 NapCat 替身（默认在子进程中启动一个）")
+    parser.add_argument("--sink-port", type=int, default=3901)
+    parser.add_argument("--sink-latency", type=float, default=0.02, help="NapCat 替身的回复延迟（秒）")
+    parser.add_argument("--sink-jitter", type=float, default=0.005, help="回复延迟的标准差（秒）")
+    parser.add_argument("--sink-error-rate", type=float, default=0.0, help="NapCat 替身回复失败的比例")
+    parser.add_argument("--serve-sink", action="store_true", help="只运行 NapCat 替身")
+    parser.add_argument("--output", help="把结果保存为 JSON")
+    parser.add_argument("--baseline", help="与之前保存的结果对比")
+    args = parser.parse_args()
+
+    if args.serve_sink:
+        print(f"NapCat 替身监听 ws://127.0.0.1:{args.sink_port}")
+        _run_sink_process("127.0.0.1", args.sink_port, args.sink_latency, args.sink_jitter, args.sink_error_rate, None)
+        return
+
+    result = asyncio.run(async_main(args))
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
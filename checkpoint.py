@@ -0,0 +1,164 @@
+"""
+消息检查点
+记录每个监听群组已处理的最大消息ID，以及补拉起点（该ID及之前的消息都已处理，中间没有缺口）。
+断线重连或重启后从补拉起点开始补拉错过的消息；实时消息只有在群组已同步（补拉成功）时才推进补拉起点，
+补拉失败或中途断线时起点保持不变，下次补拉时重试，错过的消息不会因为之后收到的实时消息而被跳过。
+"""
+
+import asyncio
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+class CheckpointStore:
+    def __init__(self, path, save_interval=5):
+        """
+        初始化检查点存储
+
+        Args:
+            path (str): 检查点文件路径（JSON）
+            save_interval (float): 有变化时写入文件的间隔（秒）
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self._checkpoints = {}  # 群组ID -> 已处理的最大消息ID
+        self._floors = {}       # 群组ID -> 补拉起点，该ID及之前的消息都已处理
+        self._synced = set()    # 已补拉完成、实时消息可以推进补拉起点的群组
+        self._dirty = False
+        self._task = None
+
+    def load(self):
+        """
+        从文件加载检查点，文件不存在时为空；旧版本的文件只有最大消息ID，作为补拉起点使用
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "checkpoints" in data:
+                checkpoints, floors = data["checkpoints"], data.get("floors", {})
+            else:
+                checkpoints = floors = data
+            self._checkpoints = {int(chat_id): int(message_id) for chat_id, message_id in checkpoints.items()}
+            self._floors = {int(chat_id): int(message_id) for chat_id, message_id in floors.items()}
+        except FileNotFoundError:
+            self._checkpoints = {}
+            self._floors = {}
+        except (ValueError, OSError, AttributeError) as e:
+            logger.warning(f"读取检查点文件失败，将不补拉历史消息: {e}")
+            self._checkpoints = {}
+            self._floors = {}
+        self._synced = set()
+
+    def get(self, chat_id):
+        """
+        获取群组已处理的最大消息ID，没有记录时返回None
+        """
+        return self._checkpoints.get(chat_id)
+
+    def floor(self, chat_id):
+        """
+        获取群组的补拉起点，没有记录时返回None
+        """
+        return self._floors.get(chat_id)
+
+    def is_synced(self, chat_id):
+        return chat_id in self._synced
+
+    def update(self, chat_id, message_id):
+        """
+        记录群组已处理的消息ID，只会向前推进；群组已同步时同时推进补拉起点
+        """
+        if message_id > self._checkpoints.get(chat_id, 0):
+            self._checkpoints[chat_id] = message_id
+            self._dirty = True
+        if chat_id in self._synced:
+            self.advance_floor(chat_id, message_id)
+
+    def advance_floor(self, chat_id, message_id):
+        """
+        推进补拉起点（调用方保证该ID及之前的消息都已处理）
+        """
+        if message_id > self._floors.get(chat_id, 0):
+            self._floors[chat_id] = message_id
+            self._dirty = True
+        if message_id > self._checkpoints.get(chat_id, 0):
+            self._checkpoints[chat_id] = message_id
+
+    def mark_synced(self, chat_id):
+        """
+        群组补拉完成后调用：已处理的消息之间没有缺口，之后的实时消息直接推进补拉起点
+        """
+        self._synced.add(chat_id)
+        message_id = self._checkpoints.get(chat_id)
+        if message_id is not None:
+            self.advance_floor(chat_id, message_id)
+
+    def desync(self, chat_ids=None):
+        """
+        连接出现问题或开始监听新的群组时调用，补拉起点停止推进，直到下次补拉完成
+
+        Args:
+            chat_ids: 群组ID，为None时表示所有群组
+        """
+        if chat_ids is None:
+            self._synced.clear()
+        else:
+            self._synced.difference_update(chat_ids)
+
+    def save(self):
+        """
+        写入检查点文件
+        """
+        self._write(self._snapshot())
+
+    def _snapshot(self):
+        """
+        在事件循环线程中复制要写入的数据，写入文件的线程不会读到正在修改的字典
+        """
+        self._dirty = False
+        return {
+            "checkpoints": {str(chat_id): message_id for chat_id, message_id in self._checkpoints.items()},
+            "floors": {str(chat_id): message_id for chat_id, message_id in self._floors.items()},
+        }
+
+    def _write(self, data):
+        """
+        先写临时文件再替换，避免写到一半时损坏
+        """
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def start(self):
+        """
+        启动定期保存任务，必须在事件循环中调用
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._save_loop())
+
+    async def stop(self):
+        """
+        停止定期保存任务并写入最后的检查点
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._dirty:
+            self.save()
+
+    async def _save_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.save_interval)
+            if not self._dirty:
+                continue
+            try:
+                await loop.run_in_executor(None, self._write, self._snapshot())
+            except OSError as e:
+                self._dirty = True
+                logger.error(f"保存检查点时出错: {e}")
@@ -16,3 +16,104 @@ QQ_ADMIN_UIN = ""      # 机器人管理员QQ号
 QQ_TARGET_GROUP = ""   # 目标QQ群号码
 QQ_WS_URI = "ws://localhost:3001"  # NapCat的WebSocket地址
 QQ_BOT_TOKEN = ""               # 如果设置了access_token，请填写
+QQ_MAX_FAILURES = 3               # 连续发生多少次连接错误后重新连接QQ机器人（QQ群拒绝消息不计入）
+QQ_RECONNECT_DELAY_MAX = 300      # 连接QQ机器人失败时重试间隔的上限（秒）
+
+# 多目标转发：Telegram群组ID -> 目标QQ群列表，未配置的群组发往 QQ_TARGET_GROUP
+# 列表元素可以是QQ群号，或 {"qq_group": QQ群号, "users": "用户ID，格式同上"}，表示只把这些用户的消息转发到该群
+# 例如: {-1001234567890: [123456, {"qq_group": 654321, "users": "1001-1005"}]}
+QQ_ROUTES = {}
+
+# QQ转发队列配置
+DELIVERY_QUEUE_SIZE = 1000        # 转发队列最大长度
+DELIVERY_WORKERS = 1              # 每个QQ群并发发送的工作协程数量（大于1时消息顺序不再严格保证，合并的消息也可能乱序）
+DELIVERY_OVERFLOW_POLICY = "drop_oldest"  # 队列满时的策略: block(等待) / drop_oldest(丢弃最早) / drop_newest(丢弃最新)
+
+# 实体缓存配置
+ENTITY_CACHE_SIZE = 5000          # 最多缓存的用户/群组实体数量
+ENTITY_CACHE_TTL = 600            # 缓存有效期（秒）
+
+# 持久化发件箱配置（发送失败或程序重启时不丢消息），路径留空表示不启用
+OUTBOX_PATH = "outbox.sqlite3"    # SQLite 数据库文件路径
+OUTBOX_FLUSH_INTERVAL = 0.05      # 批量写入的合并窗口（秒）
+OUTBOX_RETRY_BASE = 2             # 发送失败后首次重试的等待时间（秒），之后按指数增长
+OUTBOX_RETRY_MAX = 300            # 重试等待时间上限（秒）
+
+# 断线补拉配置
+CHECKPOINT_PATH = "checkpoints.json"  # 记录每个群组已处理到的消息ID
+CATCH_UP_CONCURRENCY = 4          # 同时补拉的群组数量
+CATCH_UP_LIMIT = 5000             # 每次请求的消息数量，一页取满时从最后一条继续补拉
+
+# 连接健康监控配置
+HEALTH_IDLE_TIMEOUT = 60          # 超过这段时间没有收到任何更新才发送探测请求（秒）
+HEALTH_PING_TIMEOUT = 10          # 探测请求超时时间（秒）
+HEALTH_CHECK_INTERVAL = 5         # 本地检查间隔（秒），检查本身不发起网络请求
+HEALTH_CHANNEL_PROBE_INTERVAL = 300  # 监听的超级群/频道超过这段时间没有更新时单独探测是否停滞（秒），0表示不探测
+
+# QQ发送限速与合并配置（避免触发QQ风控）
+QQ_SEND_RATE = 1.0                # 每个QQ群每秒最多发送的消息数量，0表示不限速
+QQ_SEND_BURST = 5                 # 允许的最大突发数量
+COALESCE_MAX_CHARS = 3000         # 限速时合并同一群组连续消息，合并后的最大字符数
+COALESCE_MAX_ITEMS = 10           # 一次最多合并的消息数量
+COALESCE_MAX_WAIT = 5             # 收集可合并消息的最长等待时间（秒）
+
+# 编辑消息防抖配置
+EDIT_DEBOUNCE_WINDOW = 3          # 同一条消息在窗口内的多次编辑只转发最后一个版本（秒），0表示不防抖
+EDIT_DEBOUNCE_MAX_PENDING = 1000  # 最多同时等待的编辑消息数量
+
+# 无交互启动配置：填写后跳过群组列表和输入提示，直接开始监听（适合在 supervisor/systemd 下运行）
+# 键为群组ID，值为要监听的用户ID（格式与交互输入相同，支持逗号分隔和范围），空字符串表示监听所有用户
+MONITOR_GROUPS = {
+    # -1001234567890: "123456789, 987654321",
+    # -1009876543210: "",
+}
+
+# 群组实体快照配置
+ENTITY_SNAPSHOT_PATH = "entity_snapshot.json"  # 已解析的群组信息，重启后无需网络请求
+ENTITY_SNAPSHOT_REFRESH_INTERVAL = 3600       # 所有群组刷新一轮的时间（秒），在后台逐个刷新
+
+# 转发流程指标配置
+METRICS_HOST = "127.0.0.1"        # 指标端口监听地址，只在本机访问
+METRICS_PORT = 9108               # Prometheus 指标端口（http://127.0.0.1:9108/metrics），0表示不启动
+METRICS_LOG_INTERVAL = 300        # 定期把指标摘要写入日志的间隔（秒），0表示不写入
+
+# 消息输出配置（每条转发的消息都会写入，不影响QQ转发）
+OUTPUT_JSONL_PATH = "messages.jsonl"  # 以每行一条JSON的格式记录消息，留空表示不记录
+OUTPUT_MAX_BYTES = 50 * 1024 * 1024   # 单个文件的最大大小，超过后轮转，0表示不轮转
+OUTPUT_BACKUP_COUNT = 5           # 轮转后保留的历史文件数量
+OUTPUT_STDOUT_PRETTY = False      # 是否同时以美化的JSON格式打印到标准输出
+OUTPUT_BUFFER_SIZE = 10000        # 等待写入的记录数量上限
+OUTPUT_OVERFLOW_POLICY = "drop_oldest"  # 缓冲区满时的策略: block / drop_oldest / drop_newest
+OUTPUT_FLUSH_INTERVAL = 1         # 批量写入的间隔（秒）
+
+# 媒体转发配置（图片、语音、视频、文件）
+MEDIA_FORWARD = True              # 是否转发媒体，关闭时没有文字的媒体消息不转发
+MEDIA_SPOOL_DIR = "media_spool"   # 媒体文件下载目录（启动时删除上次下载的文件）
+MEDIA_MAX_FILE_SIZE = 100 * 1024 * 1024        # 超过该大小的文件只转发文字说明（字节）
+MEDIA_MAX_CONCURRENT_DOWNLOADS = 2             # 同时下载的文件数量
+MEDIA_MAX_BYTES_IN_FLIGHT = 200 * 1024 * 1024  # 同时下载的文件总大小上限（字节）
+MEDIA_CACHE_MAX_BYTES = 1024 * 1024 * 1024     # 下载目录中保留的文件总大小，同一文件再次转发时无需重新下载（字节）
+MEDIA_CHUNK_SIZE = 512 * 1024     # 每次下载的块大小（字节），必须是4096的倍数，最大512KB
+MEDIA_QUEUE_SIZE = 100            # 媒体转发队列最大长度
+MEDIA_WORKERS = 2                 # 并发发送媒体的工作协程数量
+
+# 消息内容过滤配置（关键词和正则表达式，格式见 README）
+CONTENT_FILTER_PATH = "filters.json"  # 过滤规则文件，文件不存在时不按内容过滤，留空表示不启用
+CONTENT_FILTER_RELOAD_INTERVAL = 5    # 检查规则文件是否修改的间隔（秒），修改后自动生效，0表示不自动重新加载
+
+# 跨群组去重配置（同一内容被发到或转发到多个监听的群组时只转发第一份）
+DEDUP_WINDOW = 0                  # 去重时间窗口（秒），0表示不去重
+DEDUP_MAX_ENTRIES = 50000         # 最多记录的消息指纹数量，内存占用固定（约每条100字节）
+
+# 消息归档配置（压缩的分段文件和索引，用 python archive.py query 查询）
+ARCHIVE_DIR = "archive"           # 归档目录，留空表示不归档
+ARCHIVE_SEGMENT_MESSAGES = 100000 # 每个分段最多的消息数量，写满后排序索引并开始新的分段
+ARCHIVE_FTS = True                # 是否建立全文索引（SQLite FTS5），用于按内容搜索
+ARCHIVE_FLUSH_INTERVAL = 5        # 批量写入的间隔（秒），每批压缩为一个数据块
+
+# 分片模式配置（python shard.py，多个Telegram会话分担监听的群组，由一个进程统一转发到QQ）
+SHARD_SESSIONS = []               # 每个监听进程使用的会话名，如 ["telegram_session", "telegram_session_2"]，每个会话都需要能看到所有监听的群组
+SHARD_HOST = "127.0.0.1"          # 监听进程与转发进程之间的本地连接地址
+SHARD_PORT = 9110                 # 本地连接端口
+SHARD_RESTART_DELAY_MAX = 300     # 监听进程反复退出时重启间隔的上限（秒）
+SHARD_REPORT_INTERVAL = 60        # 把各分片的健康状态和吞吐量写入日志的间隔（秒），0表示不写入
@@ -0,0 +1,320 @@
+"""
+消息内容过滤
+每个群组可以配置包含/排除的关键词和正则表达式。
+同一组的所有关键词编译为一个 Aho-Corasick 自动机，所有正则合并为一个分支表达式
+（带全局内联标志或按编号反向引用的表达式除外，这些表达式单独匹配），
+无论规则有多少条，匹配时通常只需扫描一遍消息文本。
+规则文件修改后自动重新加载，无需重启 Telegram 客户端。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# 规则文件中适用于所有未单独配置的群组的键
+DEFAULT_RULES_KEY = "*"
+
+
+class AhoCorasick:
+    """
+    多关键词匹配自动机，构建后只读
+    """
+    __slots__ = ("_goto", "_fail", "_out")
+
+    def __init__(self, keywords):
+        """
+        Args:
+            keywords: 关键词的可迭代对象，空字符串会被忽略
+        """
+        goto = [{}]
+        out = [None]
+        for keyword in keywords:
+            if not keyword:
+                continue
+            node = 0
+            for ch in keyword:
+                next_node = goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][ch] = next_node
+                    goto.append({})
+                    out.append(None)
+                node = next_node
+            if out[node] is None:
+                out[node] = keyword
+
+        # 广度优先计算失败指针（第一层节点指向根），并把失败指针上的匹配结果合并到当前节点
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in goto[node].items():
+                queue.append(child)
+                state = fail[node]
+                while state and ch not in goto[state]:
+                    state = fail[state]
+                fail[child] = goto[state].get(ch, 0)
+                if out[child] is None:
+                    out[child] = out[fail[child]]
+
+        self._goto = goto
+        self._fail = fail
+        self._out = out
+
+    def __bool__(self):
+        return len(self._goto) > 1
+
+    def search(self, text):
+        """
+        返回文本中出现的第一个关键词，没有时返回None
+        """
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        node = 0
+        for ch in text:
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node] is not None:
+                return out[node]
+        return None
+
+
+# 合并后含义会改变或无法编译的表达式: 开头的全局内联标志（如 "(?i)"）、按编号的反向引用（编号在合并后会偏移）
+_INLINE_GLOBAL_FLAGS = re.compile(r"^\(\?[aiLmsux]+\)")
+_NUMBERED_BACKREF = re.compile(r"\\(?:[1-9]|g<\d+>)")
+
+
+class RegexSet:
+    """
+    多个正则表达式：能合并的合并为一个分支表达式，其余的逐个匹配
+    """
+    __slots__ = ("combined", "separate")
+
+    def __init__(self, combined, separate):
+        self.combined = combined
+        self.separate = separate
+
+    def search(self, text):
+        """
+        返回第一个匹配，没有时返回None
+        """
+        if self.combined is not None:
+            match = self.combined.search(text)
+            if match is not None:
+                return match
+        for pattern in self.separate:
+            match = pattern.search(text)
+            if match is not None:
+                return match
+        return None
+
+
+def compile_regex(patterns, ignore_case=True):
+    """
+    把多个正则表达式合并为一个分支表达式，无效的表达式会被跳过；
+    不能安全合并的表达式（全局内联标志、按编号的反向引用、合并后编译失败）单独编译
+
+    Returns:
+        RegexSet: 编译后的表达式，没有有效的表达式时返回None
+    """
+    flags = re.IGNORECASE if ignore_case else 0
+    mergeable = []
+    separate = []
+    for pattern in patterns:
+        try:
+            compiled = re.compile(pattern, flags)
+        except re.error as e:
+            logger.warning(f"无效的正则表达式 {pattern!r}: {e}")
+            continue
+        if _INLINE_GLOBAL_FLAGS.match(pattern) or _NUMBERED_BACKREF.search(pattern):
+            separate.append(compiled)
+        else:
+            mergeable.append((pattern, compiled))
+    combined = None
+    if len(mergeable) == 1:
+        combined = mergeable[0][1]
+    elif mergeable:
+        try:
+            combined = re.compile("|".join(f"(?:{pattern})" for pattern, _ in mergeable), flags)
+        except re.error as e:
+            # 例如不同表达式中使用了同名的分组
+            logger.warning(f"正则表达式无法合并，将逐个匹配: {e}")
+            separate = [compiled for _, compiled in mergeable] + separate
+    if combined is None and not separate:
+        return None
+    return RegexSet(combined, separate)
+
+
+class RuleSet:
+    """
+    一个群组编译后的过滤规则
+    """
+    __slots__ = ("ignore_case", "include_keywords", "exclude_keywords", "include_regex", "exclude_regex", "rule_count")
+
+    def __init__(self, include_keywords=(), exclude_keywords=(), include_regex=(), exclude_regex=(), ignore_case=True):
+        """
+        Args:
+            include_keywords: 包含其中任意一个关键词的消息才转发
+            exclude_keywords: 包含其中任意一个关键词的消息不转发
+            include_regex: 匹配其中任意一个正则的消息才转发
+            exclude_regex: 匹配其中任意一个正则的消息不转发
+            ignore_case (bool): 是否忽略大小写
+        """
+        normalize = str.casefold if ignore_case else str
+        self.ignore_case = ignore_case
+        self.include_keywords = AhoCorasick(normalize(k) for k in include_keywords) if include_keywords else None
+        self.exclude_keywords = AhoCorasick(normalize(k) for k in exclude_keywords) if exclude_keywords else None
+        self.include_regex = compile_regex(include_regex, ignore_case) if include_regex else None
+        self.exclude_regex = compile_regex(exclude_regex, ignore_case) if exclude_regex else None
+        self.rule_count = len(include_keywords) + len(exclude_keywords) + len(include_regex) + len(exclude_regex)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            include_keywords=list(data.get("include_keywords") or ()),
+            exclude_keywords=list(data.get("exclude_keywords") or ()),
+            include_regex=list(data.get("include_regex") or ()),
+            exclude_regex=list(data.get("exclude_regex") or ()),
+            ignore_case=data.get("ignore_case", True)
+        )
+
+    def matches(self, text):
+        """
+        判断消息文本是否需要转发：不命中任何排除规则，且配置了包含规则时至少命中一条
+        """
+        text = text or ""
+        folded = text.casefold() if self.ignore_case else text
+        if self.exclude_keywords is not None and self.exclude_keywords.search(folded) is not None:
+            return False
+        if self.exclude_regex is not None and self.exclude_regex.search(text) is not None:
+            return False
+        if self.include_keywords is None and self.include_regex is None:
+            return True
+        if self.include_keywords is not None and self.include_keywords.search(folded) is not None:
+            return True
+        return self.include_regex is not None and self.include_regex.search(text) is not None
+
+
+def load_rules(path):
+    """
+    读取并编译规则文件
+
+    Returns:
+        dict: 群组ID（或 DEFAULT_RULES_KEY） -> RuleSet
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    rules = {}
+    for key, value in data.items():
+        if key != DEFAULT_RULES_KEY:
+            key = int(key)
+        rules[key] = RuleSet.from_dict(value)
+    return rules
+
+
+class ContentFilter:
+    def __init__(self, path, reload_interval=5):
+        """
+        初始化内容过滤器
+
+        Args:
+            path (str): 规则文件路径（JSON），文件不存在时不过滤
+            reload_interval (float): 检查规则文件是否修改的间隔（秒），0表示不自动重新加载
+        """
+        self.path = path
+        self.reload_interval = reload_interval
+        self._rules = {}
+        self._default = None
+        self._mtime = None
+        self._task = None
+
+        # 统计
+        self.reloads = 0
+
+    def load(self):
+        """
+        同步加载规则文件，文件不存在时不过滤，加载失败时保留原来的规则
+        """
+        self._apply(self._read())
+
+    def get(self, group_id):
+        """
+        获取群组的过滤规则，没有配置时返回默认规则或None
+        """
+        return self._rules.get(group_id, self._default)
+
+    def start(self):
+        """
+        启动规则文件监控，必须在事件循环中调用
+        """
+        if self._task is None and self.reload_interval:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self):
+        """
+        获取过滤规则统计信息
+        """
+        return {
+            "groups": len(self._rules),
+            "has_default": self._default is not None,
+            "rules": sum(r.rule_count for r in self._rules.values()) + (self._default.rule_count if self._default else 0),
+            "reloads": self.reloads,
+        }
+
+    def _read(self):
+        """
+        读取并编译规则文件，文件没有修改时返回None
+        """
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = 0
+        if mtime == self._mtime:
+            return None
+        if not mtime:
+            return {}, mtime
+        try:
+            return load_rules(self.path), mtime
+        except (ValueError, TypeError, AttributeError, OSError, re.error) as e:
+            logger.error(f"加载过滤规则 {self.path} 失败，继续使用原来的规则: {e}")
+            return None, mtime
+
+    def _apply(self, result):
+        """
+        在事件循环中整体替换规则，匹配时不会看到只更新了一半的规则
+        """
+        if result is None:
+            return
+        rules, mtime = result
+        reloaded = self._mtime is not None
+        self._mtime = mtime
+        if rules is None:
+            return
+        self._default = rules.pop(DEFAULT_RULES_KEY, None)
+        self._rules = rules
+        if reloaded:
+            self.reloads += 1
+            logger.info(f"已重新加载过滤规则: {self.get_stats()}")
+
+    async def _watch(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            try:
+                # 编译大量规则需要一些时间，放到线程中执行
+                self._apply(await loop.run_in_executor(None, self._read))
+            except Exception as e:
+                logger.error(f"检查过滤规则文件时出错: {e}")
@@ -0,0 +1,120 @@
+"""
+编辑消息防抖
+同一条消息在短时间内被多次编辑时，只在窗口结束后转发最后一个版本。
+窗口从第一次编辑开始计算，连续编辑不会无限推迟转发。
+"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class EditDebouncer:
+    def __init__(self, on_fire, window=3, maxsize=1000):
+        """
+        初始化编辑防抖器
+
+        Args:
+            on_fire: 窗口结束时调用的协程函数，参数为最后一个版本的消息
+            window (float): 防抖窗口（秒）
+            maxsize (int): 最多同时等待的消息数量，超出时立即转发最早的消息
+        """
+        self.on_fire = on_fire
+        self.window = window
+        self.maxsize = maxsize
+
+        # (chat_id, message_id) -> (转发时间, 最新版本的消息)，按转发时间先后排列
+        self._pending = OrderedDict()
+        self._wakeup = None
+        self._task = None
+
+        # 统计
+        self.submitted = 0
+        self.collapsed = 0
+        self.fired = 0
+        self.evicted = 0
+
+    def start(self):
+        """
+        启动防抖任务，必须在事件循环中调用
+        """
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        停止防抖任务，并立即转发所有等待中的消息
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._pending:
+            _, (_, message) = self._pending.popitem(last=False)
+            await self._fire(message)
+
+    def submit(self, key, message):
+        """
+        提交一次编辑，窗口内的后续编辑会替换之前的版本
+
+        Args:
+            key: 消息键，通常为 (chat_id, message_id)
+            message: 编辑后的消息
+        """
+        self.submitted += 1
+        entry = self._pending.get(key)
+        if entry is not None:
+            # 保留原来的转发时间和位置，只替换消息内容
+            self._pending[key] = (entry[0], message)
+            self.collapsed += 1
+            return
+        self._pending[key] = (time.monotonic() + self.window, message)
+        if len(self._pending) == 1 or len(self._pending) > self.maxsize:
+            self._wakeup.set()
+
+    def get_stats(self):
+        """
+        获取防抖统计信息
+        """
+        return {
+            "pending": len(self._pending),
+            "submitted": self.submitted,
+            "collapsed": self.collapsed,
+            "fired": self.fired,
+            "evicted": self.evicted,
+        }
+
+    async def _run(self):
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            key, (fire_at, message) = next(iter(self._pending.items()))
+            delay = fire_at - time.monotonic()
+            if delay > 0 and len(self._pending) <= self.maxsize:
+                # 新加入的消息转发时间都更晚，只需等待队首
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if delay > 0:
+                self.evicted += 1
+            # 取出时再读一次，期间可能有更新的版本
+            _, message = self._pending.pop(key)
+            await self._fire(message)
+
+    async def _fire(self, message):
+        self.fired += 1
+        try:
+            await self.on_fire(message)
+        except Exception as e:
+            logger.error(f"转发编辑消息时出错: {e}")
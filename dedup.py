@@ -0,0 +1,159 @@
+"""
+跨群组消息去重
+同一条公告被发到或转发到多个监听的群组时，只转发时间窗口内的第一份。
+每条消息按规范化后的文本（和媒体文件）计算一个指纹，转发的消息再按原始来源计算一个指纹，
+任意一个指纹在窗口内由其他群组发过就视为重复；同一个群组里重复发送的相同内容（例如“+1”）照常转发。
+缓存只保存8字节的指纹和第一次出现的群组，条目数量有上限，内存占用与消息量无关。
+"""
+
+import hashlib
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from telethon.utils import get_peer_id
+
+# 零宽字符常被用来让相同的文本看起来不同
+_INVISIBLE = dict.fromkeys(map(ord, "\u200b\u200c\u200d\u2060\ufeff"))
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """
+    规范化消息文本：统一全角/半角和大小写，去掉零宽字符，合并空白
+    """
+    text = unicodedata.normalize("NFKC", text or "").translate(_INVISIBLE).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def fingerprint(*parts):
+    """
+    计算若干部分组成的指纹（8字节整数）
+    """
+    data = "\x1f".join(map(str, parts)).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+
+def forward_origin(message):
+    """
+    转发消息的原始来源（来源会话和原消息ID或时间），不是转发的消息时返回None
+    """
+    fwd = getattr(message, "fwd_from", None)
+    if fwd is None:
+        return None
+    if fwd.from_id is not None:
+        source = get_peer_id(fwd.from_id)
+    elif fwd.from_name:
+        source = fwd.from_name
+    else:
+        return None
+    return source, fwd.channel_post or int(fwd.date.timestamp())
+
+
+def message_keys(text, origin=None, media=None):
+    """
+    计算消息的去重指纹
+
+    Args:
+        text (str): 消息文本
+        origin: forward_origin 的返回值
+        media: 媒体文件标识，没有媒体时为None
+
+    Returns:
+        list: 指纹列表，文本和媒体都为空且不是转发的消息时为空列表
+    """
+    keys = []
+    normalized = normalize_text(text)
+    if normalized or media is not None:
+        keys.append(fingerprint("text", normalized, media))
+    if origin is not None:
+        keys.append(fingerprint("origin", *origin))
+    return keys
+
+
+class DedupCache:
+    def __init__(self, maxsize=50000, ttl=600):
+        """
+        初始化去重缓存
+
+        Args:
+            maxsize (int): 最多记录的指纹数量，超出后淘汰最早的指纹
+            ttl (float): 去重时间窗口（秒），从第一次出现开始计算
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # 指纹 -> (过期时间, 第一次出现的群组ID)，按第一次出现的顺序排列
+
+        # 统计
+        self.checks = 0
+        self.hits = 0
+
+    def seen(self, keys, chat_id=None):
+        """
+        检查消息是否在时间窗口内由其他群组发过，并记录这条消息的指纹
+
+        Args:
+            keys: 消息的指纹
+            chat_id: 消息所在的群组ID，为None时只要指纹出现过就视为重复
+
+        Returns:
+            bool: 任意一个指纹在窗口内由其他群组发过时返回True
+        """
+        if not keys:
+            return False
+        now = time.monotonic()
+        self._expire(now)
+        self.checks += 1
+        entries = self._entries
+        duplicate = any(
+            key in entries and (chat_id is None or entries[key][1] != chat_id)
+            for key in keys
+        )
+        if duplicate:
+            self.hits += 1
+        # 只记录新的指纹，重复的消息不会延长窗口
+        entry = (now + self.ttl, chat_id)
+        for key in keys:
+            if key not in entries:
+                entries[key] = entry
+        while len(entries) > self.maxsize:
+            entries.popitem(last=False)
+        return duplicate
+
+    def add(self, key):
+        """
+        记录一个指纹，不计入统计
+        """
+        self._entries.setdefault(key, (time.monotonic() + self.ttl, None))
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] >= time.monotonic()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """
+        获取去重统计信息
+        """
+        return {
+            "size": len(self._entries),
+            "checks": self.checks,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.checks, 3) if self.checks else None,
+        }
+
+    def _expire(self, now):
+        """
+        删除已过期的指纹，指纹按过期时间排列，只需检查开头
+        """
+        entries = self._entries
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at >= now:
+                break
+            del entries[key]
@@ -0,0 +1,352 @@
+"""
+QQ消息转发队列
+Telethon 的事件回调只负责把消息放入有界队列并立即返回，
+由若干个异步工作协程从队列中取出消息并调用 ncatbot 的异步接口发送，
+避免 NapCat 的网络往返阻塞 Telegram 的事件循环。
+配置了限速器时，令牌用完期间会把同一来源群组的连续消息合并为一条发送。
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+logger = logging.getLogger(__name__)
+
+# 队列满时的处理策略
+OVERFLOW_BLOCK = "block"              # 等待队列有空位（会反压到Telegram事件回调）
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃队列中最早的消息
+OVERFLOW_DROP_NEWEST = "drop_newest"  # 丢弃新到达的消息
+OVERFLOW_POLICIES = (OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+
+@dataclass
+class DeliveryItem:
+    """
+    队列中等待发送的一条消息
+    """
+    text: str
+    outbox_id: int = None       # 发件箱中的记录ID，未启用发件箱时为None
+    source_chat_id: int = None  # 来源Telegram群组ID，只有同一来源的消息才会合并
+    message_id: int = None      # 来源Telegram消息ID，用于在发送前替换为编辑后的版本
+    enqueued_at: float = field(default_factory=time.monotonic)
+    media: object = None        # 需要转发媒体时为对应的Telegram消息
+    parts: list = field(default_factory=list)  # 合并发送时包含的原始消息
+
+    @property
+    def key(self):
+        if self.source_chat_id is None or self.message_id is None:
+            return None
+        return (self.source_chat_id, self.message_id)
+
+    def iter_parts(self):
+        """
+        返回这次发送包含的原始消息（未合并时为自身）
+        """
+        return self.parts or [self]
+
+
+@dataclass
+class Handoff:
+    """
+    格式化好的一条Telegram消息，交给转发流程写入消息输出并放入各目标QQ群的转发队列
+    分片模式下由监听进程经本地连接发给转发进程，media 只能在同一进程内传递
+    """
+    chat_id: int
+    message_id: int
+    text: str                   # 发送到QQ的文本
+    record: dict                # 写入消息输出的记录
+    targets: list               # 目标QQ群号
+    edit_date: object = None    # 编辑时间（datetime），新消息为None
+    is_edited: bool = False
+    dedup_keys: list = field(default_factory=list)  # 跨群组去重的指纹，未启用去重时为空
+    message_key: int = None     # 这条消息本身的指纹，用于让被去重的消息之后的编辑也不转发
+    media: object = None        # 需要转发媒体时为对应的Telegram消息
+    media_label: str = None
+
+
+class _PeekableQueue(asyncio.Queue):
+    """
+    可以查看队首元素的队列
+    """
+
+    def peek_nowait(self):
+        return self._queue[0] if self._queue else None
+
+
+class DeliveryQueue:
+    def __init__(self, send_func, maxsize=1000, workers=1,
+                 overflow_policy=OVERFLOW_DROP_OLDEST, report_interval=60, on_drop=None,
+                 rate_limiter=None, coalesce_max_chars=3000, coalesce_max_items=10, coalesce_max_wait=5,
+                 name="QQ转发队列"):
+        """
+        初始化转发队列
+
+        Args:
+            send_func: 实际发送消息的协程函数，参数为 DeliveryItem，发送失败时抛出异常
+            maxsize (int): 队列最大长度
+            workers (int): 并发发送的工作协程数量（大于1时消息顺序不再严格保证）
+            overflow_policy (str): 队列满时的处理策略，见 OVERFLOW_POLICIES
+            report_interval (int): 定期输出队列统计日志的间隔（秒），0表示不输出
+            on_drop: 消息因队列已满被丢弃时调用的函数，参数为被丢弃的 DeliveryItem
+            rate_limiter (TokenBucket): 发送限速器，为None时不限速也不合并
+            coalesce_max_chars (int): 合并后消息的最大字符数
+            coalesce_max_items (int): 一次最多合并的消息数量
+            coalesce_max_wait (float): 等待令牌期间收集可合并消息的最长时间（秒）
+            name (str): 队列名称，用于日志
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的队列溢出策略: {overflow_policy}")
+
+        self.send_func = send_func
+        self.maxsize = maxsize
+        self.worker_count = max(1, workers)
+        self.overflow_policy = overflow_policy
+        self.report_interval = report_interval
+        self.on_drop = on_drop
+        self.rate_limiter = rate_limiter
+        self.coalesce_max_chars = coalesce_max_chars
+        self.coalesce_max_items = coalesce_max_items
+        self.coalesce_max_wait = coalesce_max_wait
+        self.name = name
+
+        self._queue = None
+        self._tasks = []
+        self._pending_by_key = {}  # (chat_id, message_id) -> 队列中尚未取出的消息
+
+        # 反压统计
+        self.enqueued = 0
+        self.sent = 0     # 发送成功的原始消息数量
+        self.posts = 0    # 实际发出的QQ消息数量（合并后）
+        self.failed = 0
+        self.dropped = 0
+        self.replaced = 0
+        self.max_depth = 0
+        self._latencies = deque(maxlen=1000)  # 最近的入队到发送完成耗时（秒）
+        self._post_times = deque(maxlen=1000)  # 最近发出QQ消息的时间，用于计算发送速率
+
+    def start(self):
+        """
+        启动工作协程，必须在事件循环中调用
+        """
+        if self._tasks:
+            return
+        self._queue = _PeekableQueue(maxsize=self.maxsize)
+        for i in range(self.worker_count):
+            self._tasks.append(asyncio.create_task(self._worker(i)))
+        if self.report_interval:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+        logger.info(f"{self.name}已启动: 工作协程 {self.worker_count} 个, 队列上限 {self.maxsize}, 溢出策略 {self.overflow_policy}")
+
+    async def stop(self, drain_timeout=10):
+        """
+        停止工作协程，停止前尽量发送完队列中剩余的消息
+
+        Args:
+            drain_timeout (float): 等待队列清空的最长时间（秒）
+        """
+        if not self._tasks:
+            return
+        if self._queue.qsize():
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"停止转发队列时仍有 {self._queue.qsize()} 条消息未发送")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def put(self, item):
+        """
+        将消息放入队列，除 block 策略外不会等待
+
+        Args:
+            item (DeliveryItem): 要发送的消息
+
+        Returns:
+            bool: 消息是否成功入队
+        """
+        queue = self._queue
+        if queue is None:
+            raise RuntimeError("转发队列尚未启动")
+
+        if queue.full():
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                self.dropped += 1
+                logger.warning(f"{self.name}已满 ({queue.qsize()})，丢弃新消息")
+                self._notify_drop(item)
+                return False
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                try:
+                    oldest = queue.get_nowait()
+                    queue.task_done()
+                    self._forget(oldest)
+                    self.dropped += 1
+                    logger.warning(f"{self.name}已满 ({queue.qsize()})，丢弃最早的消息")
+                    self._notify_drop(oldest)
+                except asyncio.QueueEmpty:
+                    pass
+
+        await queue.put(item)
+        if item.key is not None:
+            self._pending_by_key[item.key] = item
+        self.enqueued += 1
+        depth = queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+        return True
+
+    def replace_pending(self, key, text):
+        """
+        如果同一条Telegram消息还在队列中等待发送，直接替换其内容而不是再发一条
+
+        Args:
+            key: (chat_id, message_id)
+            text (str): 新的消息文本
+
+        Returns:
+            DeliveryItem: 被替换的消息，不在队列中时返回None
+        """
+        item = self._pending_by_key.get(key)
+        if item is None:
+            return None
+        item.text = text
+        self.replaced += 1
+        return item
+
+    def _forget(self, item):
+        """
+        消息离开队列后不再允许被替换
+        """
+        key = item.key
+        if key is not None and self._pending_by_key.get(key) is item:
+            del self._pending_by_key[key]
+
+    def _notify_drop(self, item):
+        if self.on_drop is not None:
+            try:
+                self.on_drop(item)
+            except Exception as e:
+                logger.error(f"处理被丢弃的消息时出错: {e}")
+
+    @property
+    def depth(self):
+        """
+        当前队列深度
+        """
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self):
+        """
+        获取队列统计信息
+        """
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 1)
+
+        # 最近一分钟的实际发送速率
+        now = time.monotonic()
+        recent_posts = sum(1 for t in self._post_times if now - t <= 60)
+
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "posts": self.posts,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "replaced": self.replaced,
+            "send_rate_per_min": recent_posts,
+            "coalesce_ratio": round(self.sent / self.posts, 2) if self.posts else None,
+            "latency_p50_ms": percentile(0.50),
+            "latency_p95_ms": percentile(0.95),
+            "latency_max_ms": round(latencies[-1] * 1000, 1) if latencies else None,
+        }
+
+    async def _worker(self, index):
+        """
+        工作协程：从队列中取出消息并发送
+        """
+        queue = self._queue
+        while True:
+            item = await queue.get()
+            self._forget(item)
+            try:
+                if self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+                    # 令牌用完，等待期间把后续同一来源的消息合并进来
+                    item = await self._coalesce(item)
+                    await self.rate_limiter.acquire()
+                await self.send_func(item)
+                now = time.monotonic()
+                self.posts += 1
+                self._post_times.append(now)
+                for part in item.iter_parts():
+                    self.sent += 1
+                    self._latencies.append(now - part.enqueued_at)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += len(item.iter_parts())
+                logger.error(f"{self.name}发送QQ消息时出错: {e}")
+            finally:
+                queue.task_done()
+
+    async def _coalesce(self, item):
+        """
+        在等待令牌期间，从队首取出同一来源群组的连续消息合并为一条
+
+        Returns:
+            DeliveryItem: 合并后的消息，没有可合并的消息时为原消息
+        """
+        queue = self._queue
+        if item.media is not None:
+            return item
+        parts = [item]
+        size = len(item.text)
+        deadline = time.monotonic() + self.coalesce_max_wait
+
+        while len(parts) < self.coalesce_max_items:
+            # 取出队首可以合并的消息
+            while len(parts) < self.coalesce_max_items:
+                head = queue.peek_nowait()
+                if (head is None or item.source_chat_id is None
+                        or head.source_chat_id != item.source_chat_id
+                        or head.parts or head.media is not None
+                        or size + len(head.text) + 2 > self.coalesce_max_chars):
+                    break
+                parts.append(queue.get_nowait())
+                queue.task_done()
+                self._forget(head)
+                size += len(head.text) + 2
+
+            wait = min(self.rate_limiter.time_until_available(), deadline - time.monotonic())
+            if wait <= 0:
+                break
+            await asyncio.sleep(min(wait, 0.05))
+
+        if len(parts) == 1:
+            return item
+        return DeliveryItem(
+            text="\n\n".join(part.text for part in parts),
+            source_chat_id=item.source_chat_id,
+            enqueued_at=item.enqueued_at,
+            parts=parts
+        )
+
+    async def _report_loop(self):
+        """
+        定期输出队列统计
+        """
+        last_enqueued = -1
+        while True:
+            await asyncio.sleep(self.report_interval)
+            if self.enqueued == last_enqueued:
+                continue
+            last_enqueued = self.enqueued
+            logger.info(f"{self.name}统计: {self.get_stats()}")
@@ -0,0 +1,67 @@
+"""
+Telegram实体缓存
+按 peer ID 缓存已解析的用户/群组实体，带 LRU 淘汰和过期时间，
+避免同一条消息或同一个群组重复调用 get_sender / get_entity。
+"""
+
+import time
+from collections import OrderedDict
+
+
+class EntityCache:
+    def __init__(self, maxsize=5000, ttl=600):
+        """
+        初始化实体缓存
+
+        Args:
+            maxsize (int): 最多缓存的实体数量，超出后淘汰最久未使用的实体
+            ttl (float): 每个实体的有效期（秒）
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # peer_id -> (过期时间, 实体)
+
+        # 命中统计
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, peer_id):
+        """
+        获取缓存的实体，不存在或已过期时返回None
+        """
+        entry = self._entries.get(peer_id)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, entity = entry
+        if expires_at < time.monotonic():
+            del self._entries[peer_id]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(peer_id)
+        self.hits += 1
+        return entity
+
+    def put(self, peer_id, entity):
+        """
+        缓存实体
+        """
+        self._entries[peer_id] = (time.monotonic() + self.ttl, entity)
+        self._entries.move_to_end(peer_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_stats(self):
+        """
+        获取缓存统计信息
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+        }
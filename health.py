@@ -0,0 +1,248 @@
+"""
+Telegram连接健康监控
+记录最近一次收到更新的时间，只有在空闲一段时间后才发送一次轻量的探测请求（updates.getState），
+探测失败或发现更新流停滞时重新连接，并在连接恢复后触发补拉。
+getState 的 pts 只属于公共消息箱（私聊和普通群），超级群和频道各有自己的 pts；
+因此还会轮流探测长时间没有更新的监听频道（channels.getFullChannel），发现服务器端前进而本地没有收到更新时同样重新连接。
+"""
+
+import asyncio
+import logging
+import time
+
+from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.functions.updates import GetStateRequest
+from telethon.tl.types import PeerChannel
+from telethon.utils import get_input_channel, get_peer_id
+
+logger = logging.getLogger(__name__)
+
+
+def update_channel_id(update):
+    """
+    更新所属的频道/超级群ID（带 -100 前缀的形式），不属于频道的更新返回None
+    """
+    channel_id = getattr(update, "channel_id", None)
+    if channel_id is None:
+        peer = getattr(getattr(update, "message", None), "peer_id", None)
+        channel_id = getattr(peer, "channel_id", None)
+    if not isinstance(channel_id, int):
+        return None
+    return get_peer_id(PeerChannel(channel_id))
+
+# 连接状态
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_RECONNECTING = "reconnecting"
+
+
+class HealthMonitor:
+    def __init__(self, client, on_reconnected=None, on_connection_lost=None, idle_timeout=60, ping_timeout=10,
+                 check_interval=5, max_failures=2, reconnect_delay_max=300, report_interval=300,
+                 channels=None, channel_probe_interval=300):
+        """
+        初始化健康监控
+
+        Args:
+            client (TelegramClient): Telegram客户端
+            on_reconnected: 重连成功后调用的协程函数（例如补拉消息）
+            on_connection_lost: 发现连接问题、开始重连时调用的函数（例如停止推进补拉起点）
+            idle_timeout (float): 超过这段时间没有收到任何更新才发送探测请求（秒）
+            ping_timeout (float): 探测请求的超时时间（秒）
+            check_interval (float): 检查间隔（秒），检查本身不发起网络请求
+            max_failures (int): 连续探测失败多少次后重连
+            reconnect_delay_max (float): 重连失败时退避等待的上限（秒）
+            report_interval (float): 定期输出连接健康统计日志的间隔（秒），0表示不输出
+            channels: 返回需要单独探测的频道的函数，{频道ID: InputPeerChannel}
+            channel_probe_interval (float): 同一频道两次探测的最短间隔（秒），频道这段时间内收到过更新时不探测，0表示不探测频道
+        """
+        self.client = client
+        self.on_reconnected = on_reconnected
+        self.on_connection_lost = on_connection_lost
+        self.idle_timeout = idle_timeout
+        self.ping_timeout = ping_timeout
+        self.check_interval = check_interval
+        self.max_failures = max_failures
+        self.reconnect_delay_max = reconnect_delay_max
+        self.report_interval = report_interval
+        self.channels = channels
+        self.channel_probe_interval = channel_probe_interval
+
+        self.state = STATE_CONNECTING
+        self.last_update_at = time.monotonic()
+        self._last_probe_at = self.last_update_at
+        self._last_pts = None
+        self._failures = 0
+        self._channel_updates = {}  # 频道ID -> 最近一次收到该频道更新的时间
+        self._channel_probes = {}   # 频道ID -> (上次探测到的 pts, 探测时间)
+
+        # 统计
+        self.updates_received = 0
+        self.probes = 0
+        self.rtt = None
+        self.reconnects = 0
+        self.stalls = 0
+        self.channel_probes = 0
+        self.channel_stalls = 0
+
+    def touch(self, update=None):
+        """
+        收到任意更新时调用，只记录时间，不发起网络请求
+        """
+        self.last_update_at = time.monotonic()
+        self.updates_received += 1
+        if update is not None:
+            channel_id = update_channel_id(update)
+            if channel_id is not None:
+                self._channel_updates[channel_id] = self.last_update_at
+
+    def get_stats(self):
+        """
+        获取连接健康统计信息
+        """
+        return {
+            "state": self.state,
+            "rtt_ms": round(self.rtt * 1000, 1) if self.rtt is not None else None,
+            "last_update_age_s": round(time.monotonic() - self.last_update_at, 1),
+            "updates_received": self.updates_received,
+            "probes": self.probes,
+            "reconnects": self.reconnects,
+            "stalls": self.stalls,
+            "channel_probes": self.channel_probes,
+            "channel_stalls": self.channel_stalls,
+        }
+
+    async def run(self):
+        """
+        持续监控连接，直到任务被取消
+        """
+        self.state = STATE_CONNECTED if self.client.is_connected() else STATE_CONNECTING
+        last_report = time.monotonic()
+        while True:
+            await asyncio.sleep(self.check_interval)
+
+            if self.report_interval and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                logger.info(f"连接健康统计: {self.get_stats()}")
+
+            if not self.client.is_connected():
+                await self._reconnect("连接已断开")
+                continue
+
+            now = time.monotonic()
+            if now - max(self.last_update_at, self._last_probe_at) >= self.idle_timeout:
+                await self._probe()
+                if self._failures:
+                    continue
+            # 其他会话一直有更新时，某个频道的更新流也可能单独停滞
+            await self._probe_channel()
+
+    async def _probe(self):
+        """
+        发送一次探测请求，同时根据 pts 判断更新流是否停滞
+        """
+        self.probes += 1
+        probe_started = time.monotonic()
+        try:
+            state = await asyncio.wait_for(self.client(GetStateRequest()), timeout=self.ping_timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._failures += 1
+            logger.warning(f"Telegram连接探测失败 ({self._failures}/{self.max_failures}): {e}")
+            if self._failures >= self.max_failures:
+                await self._reconnect("连续探测失败")
+            return
+
+        self.rtt = time.monotonic() - probe_started
+        self._failures = 0
+        self.state = STATE_CONNECTED
+
+        # 服务器端的 pts 前进了，但上次探测之后一条更新都没有收到，说明更新流已停滞
+        stalled = (
+            self._last_pts is not None
+            and state.pts != self._last_pts
+            and self.last_update_at < self._last_probe_at
+        )
+        self._last_pts = state.pts
+        self._last_probe_at = probe_started
+        if stalled:
+            self.stalls += 1
+            await self._reconnect("更新流停滞")
+
+    async def _probe_channel(self):
+        """
+        探测最久没有更新的一个频道：服务器端的 pts 在上次探测之后前进了，但这期间没有收到该频道的任何更新，说明更新流已停滞
+        每次检查最多探测一个频道，避免频繁请求触发限流
+        """
+        if not self.channel_probe_interval or self.channels is None:
+            return
+        now = time.monotonic()
+        candidates = [
+            (max(self._channel_updates.get(channel_id, 0), self._channel_probes.get(channel_id, (None, 0))[1]),
+             channel_id, input_peer)
+            for channel_id, input_peer in self.channels().items()
+        ]
+        candidates = [c for c in candidates if now - c[0] >= self.channel_probe_interval]
+        if not candidates:
+            return
+        _, channel_id, input_peer = min(candidates, key=lambda c: c[0])
+
+        self.channel_probes += 1
+        probe_started = time.monotonic()
+        try:
+            full = await asyncio.wait_for(
+                self.client(GetFullChannelRequest(get_input_channel(input_peer))), timeout=self.ping_timeout
+            )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # 连接问题由 getState 探测负责，这里只记录，下次轮到时再试
+            self._channel_probes[channel_id] = (None, probe_started)
+            logger.warning(f"探测频道 {channel_id} 失败: {e}")
+            return
+
+        pts = full.full_chat.pts
+        last_pts, last_probe_at = self._channel_probes.get(channel_id, (None, 0))
+        self._channel_probes[channel_id] = (pts, probe_started)
+        stalled = (
+            last_pts is not None
+            and pts != last_pts
+            and self._channel_updates.get(channel_id, 0) < last_probe_at
+        )
+        if stalled:
+            self.channel_stalls += 1
+            await self._reconnect(f"频道 {channel_id} 的更新流停滞")
+
+    async def _reconnect(self, reason):
+        """
+        断开并重新连接，失败时按指数退避重试，成功后调用 on_reconnected
+        """
+        self.state = STATE_RECONNECTING
+        logger.warning(f"{reason}，正在重新连接Telegram...")
+        if self.on_connection_lost is not None:
+            self.on_connection_lost()
+        delay = self.check_interval
+        while True:
+            try:
+                await self.client.disconnect()
+                await self.client.connect()
+                # 请求一次 getState，服务器才会继续向这个连接推送更新
+                state = await asyncio.wait_for(self.client(GetStateRequest()), timeout=self.ping_timeout)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"重新连接失败，{delay} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_delay_max)
+
+        self.reconnects += 1
+        self._failures = 0
+        self._last_pts = state.pts
+        self._last_probe_at = self.last_update_at = time.monotonic()
+        self._channel_probes = {}
+        self.state = STATE_CONNECTED
+        logger.info(f"已重新连接Telegram (第 {self.reconnects} 次)")
+        if self.on_reconnected is not None:
+            await self.on_reconnected()
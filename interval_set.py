@@ -0,0 +1,78 @@
+"""
+整数区间集合
+用于保存用户ID过滤条件：输入的ID和ID范围在加载时合并为有序且互不重叠的区间，
+内存占用只与区间数量有关，成员判断使用二分查找。
+"""
+
+from bisect import bisect_right
+
+
+class IntervalSet:
+    __slots__ = ("_starts", "_ends")
+
+    def __init__(self, intervals=()):
+        """
+        初始化区间集合
+
+        Args:
+            intervals: 闭区间 (start, end) 的可迭代对象，可以无序、重叠或相邻
+        """
+        starts = []
+        ends = []
+        for start, end in sorted((min(a, b), max(a, b)) for a, b in intervals):
+            # 与上一个区间重叠或相邻时合并
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+        self._starts = starts
+        self._ends = ends
+
+    @classmethod
+    def from_ids(cls, ids):
+        """
+        由单个ID的可迭代对象创建区间集合
+        """
+        return cls((i, i) for i in ids)
+
+    def __contains__(self, value):
+        try:
+            i = bisect_right(self._starts, value) - 1
+        except TypeError:
+            # 例如发送者ID为None
+            return False
+        return i >= 0 and value <= self._ends[i]
+
+    def __bool__(self):
+        return bool(self._starts)
+
+    def __len__(self):
+        """
+        集合中包含的ID数量
+        """
+        return sum(end - start + 1 for start, end in zip(self._starts, self._ends))
+
+    def __eq__(self, other):
+        if not isinstance(other, IntervalSet):
+            return NotImplemented
+        return self._starts == other._starts and self._ends == other._ends
+
+    def __hash__(self):
+        return hash((tuple(self._starts), tuple(self._ends)))
+
+    def intervals(self):
+        """
+        获取合并后的区间列表
+        """
+        return list(zip(self._starts, self._ends))
+
+    def __str__(self):
+        return ", ".join(
+            str(start) if start == end else f"{start}-{end}"
+            for start, end in zip(self._starts, self._ends)
+        )
+
+    def __repr__(self):
+        return f"IntervalSet({self.intervals()!r})"
@@ -1,19 +1,50 @@
 import asyncio
-import json
+import functools
 import logging
+import os
+import time
 from datetime import datetime, timezone, timedelta
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError
 from telethon.tl.types import (
-    Chat, Channel, User
+    Chat, Channel, User, InputPeerChannel
 )
 from telethon import events
-from ncatbot.core import BotClient
 
-
-from config import API_ID, API_HASH, SESSION_NAME, QQ_BOT_UIN, QQ_ADMIN_UIN, QQ_TARGET_GROUP
-bot = BotClient()
-api = bot.run_blocking(bt_uin=QQ_BOT_UIN, root=QQ_ADMIN_UIN)
+from delivery import DeliveryQueue, DeliveryItem, Handoff
+from entity_cache import EntityCache
+from interval_set import IntervalSet
+from outbox import Outbox
+from checkpoint import CheckpointStore
+from health import HealthMonitor
+from ratelimit import TokenBucket
+from debounce import EditDebouncer
+from snapshot import EntitySnapshot
+from metrics import MetricsRegistry
+from sink import JsonlFileSink, StdoutSink
+from archive import ArchiveSink
+from content_filter import ContentFilter
+from media import MediaSpool, media_kind, media_key, MEDIA_FILE, MEDIA_LABELS
+from dedup import DedupCache, fingerprint, forward_origin, message_keys
+from qqbot import QQBot, check_response
+from config import API_ID, API_HASH, SESSION_NAME, QQ_BOT_UIN, QQ_ADMIN_UIN, QQ_TARGET_GROUP, QQ_ROUTES
+from config import DELIVERY_QUEUE_SIZE, DELIVERY_WORKERS, DELIVERY_OVERFLOW_POLICY
+from config import ENTITY_CACHE_SIZE, ENTITY_CACHE_TTL
+from config import OUTBOX_PATH, OUTBOX_FLUSH_INTERVAL, OUTBOX_RETRY_BASE, OUTBOX_RETRY_MAX
+from config import CHECKPOINT_PATH, CATCH_UP_CONCURRENCY, CATCH_UP_LIMIT
+from config import HEALTH_IDLE_TIMEOUT, HEALTH_PING_TIMEOUT, HEALTH_CHECK_INTERVAL, HEALTH_CHANNEL_PROBE_INTERVAL
+from config import QQ_MAX_FAILURES, QQ_RECONNECT_DELAY_MAX
+from config import QQ_SEND_RATE, QQ_SEND_BURST, COALESCE_MAX_CHARS, COALESCE_MAX_ITEMS, COALESCE_MAX_WAIT
+from config import EDIT_DEBOUNCE_WINDOW, EDIT_DEBOUNCE_MAX_PENDING
+from config import MONITOR_GROUPS, ENTITY_SNAPSHOT_PATH, ENTITY_SNAPSHOT_REFRESH_INTERVAL
+from config import METRICS_HOST, METRICS_PORT, METRICS_LOG_INTERVAL
+from config import OUTPUT_JSONL_PATH, OUTPUT_MAX_BYTES, OUTPUT_BACKUP_COUNT, OUTPUT_STDOUT_PRETTY
+from config import OUTPUT_BUFFER_SIZE, OUTPUT_OVERFLOW_POLICY, OUTPUT_FLUSH_INTERVAL
+from config import CONTENT_FILTER_PATH, CONTENT_FILTER_RELOAD_INTERVAL
+from config import DEDUP_WINDOW, DEDUP_MAX_ENTRIES
+from config import ARCHIVE_DIR, ARCHIVE_SEGMENT_MESSAGES, ARCHIVE_FTS, ARCHIVE_FLUSH_INTERVAL
+from config import MEDIA_FORWARD, MEDIA_SPOOL_DIR, MEDIA_MAX_FILE_SIZE, MEDIA_MAX_CONCURRENT_DOWNLOADS
+from config import MEDIA_MAX_BYTES_IN_FLIGHT, MEDIA_CACHE_MAX_BYTES, MEDIA_CHUNK_SIZE, MEDIA_QUEUE_SIZE, MEDIA_WORKERS
 # 设置日志
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -32,12 +63,220 @@ class TelegramMonitor:
         self.me = None
         self.is_monitoring = False
         
+        # 用户/群组实体缓存
+        self.entity_cache = EntityCache(maxsize=ENTITY_CACHE_SIZE, ttl=ENTITY_CACHE_TTL)
+        
+        # 群组实体快照，重启后无需网络请求即可解析群组
+        self.snapshot = EntitySnapshot(ENTITY_SNAPSHOT_PATH)
+        self._snapshot_task = None
+        
         # 监听配置
         self.target_group_ids = []  # 目标群组ID列表
-        self.target_user_ids = {}   # 目标用户ID字典，以群组ID为键
+        self.target_user_ids = {}   # 目标用户ID区间集合(IntervalSet)，以群组ID为键
+        
+        # 路由表，由 build_routes 根据上面的配置生成
+        self.routes = {}            # 群组ID -> 允许的用户ID集合，None表示所有用户
+        self.group_titles = {}      # 群组ID -> 群组名称
+        
+        # 按消息内容过滤（关键词和正则），规则文件修改后自动重新加载
+        self.content_filter = None
+        if CONTENT_FILTER_PATH:
+            self.content_filter = ContentFilter(CONTENT_FILTER_PATH, reload_interval=CONTENT_FILTER_RELOAD_INTERVAL)
+        
+        # 跨群组去重，同一内容在时间窗口内只转发第一份
+        self.dedup = None
+        if DEDUP_WINDOW:
+            self.dedup = DedupCache(maxsize=DEDUP_MAX_ENTRIES, ttl=DEDUP_WINDOW)
+        
+        # QQ机器人连接，与Telegram客户端同时在后台启动，断开后自动重新连接
+        # 分片模式下的监听进程中由 shard.ShardClient 设置，格式化好的消息发给转发进程
+        self.shard_client = None
+        
+        self.qq = QQBot(QQ_BOT_UIN, QQ_ADMIN_UIN, max_failures=QQ_MAX_FAILURES, reconnect_delay_max=QQ_RECONNECT_DELAY_MAX)
+        self._started_at = None
         
         # QQ转发配置
-        self.qq_target_group = QQ_TARGET_GROUP
+        # 每个目标QQ群有自己的转发队列、工作协程和限速器，一个群发送缓慢或被限速不会影响其他群
+        self.qq_target_group = int(QQ_TARGET_GROUP or 0)  # 未在 QQ_ROUTES 中配置的群组发往这个QQ群
+        self.fanout = {}                         # Telegram群组ID -> ((QQ群号, 允许的用户ID集合或None), ...)
+        self.deliveries = {}                     # QQ群号 -> 文字消息转发队列
+        self.media_deliveries = {}               # QQ群号 -> 媒体转发队列
+        self._delivery_started = False
+        
+        # 媒体文件下载，所有目标QQ群共用，同一文件只下载一次
+        self.media_spool = None
+        if MEDIA_FORWARD:
+            self.media_spool = MediaSpool(
+                self.client,
+                MEDIA_SPOOL_DIR,
+                max_concurrent=MEDIA_MAX_CONCURRENT_DOWNLOADS,
+                max_bytes_in_flight=MEDIA_MAX_BYTES_IN_FLIGHT,
+                max_file_size=MEDIA_MAX_FILE_SIZE,
+                cache_max_bytes=MEDIA_CACHE_MAX_BYTES,
+                chunk_size=MEDIA_CHUNK_SIZE
+            )
+        
+        # 持久化发件箱，未配置路径时不启用
+        self.outbox = None
+        if OUTBOX_PATH:
+            self.outbox = Outbox(
+                OUTBOX_PATH,
+                on_ready=self._enqueue_from_outbox,
+                flush_interval=OUTBOX_FLUSH_INTERVAL,
+                retry_base=OUTBOX_RETRY_BASE,
+                retry_max=OUTBOX_RETRY_MAX
+            )
+        
+        # 编辑消息防抖，窗口为0时不防抖
+        self.edit_debouncer = None
+        if EDIT_DEBOUNCE_WINDOW:
+            self.edit_debouncer = EditDebouncer(
+                self._forward_edited_message,
+                window=EDIT_DEBOUNCE_WINDOW,
+                maxsize=EDIT_DEBOUNCE_MAX_PENDING
+            )
+        
+        # 每个群组已处理的最大消息ID，用于断线重连和重启后补拉消息
+        self.checkpoints = CheckpointStore(CHECKPOINT_PATH)
+        self._catch_up_lock = asyncio.Lock()
+        self._catch_up_task = None
+        self._catch_up_pending = False
+        self._live_first = {}  # 群组ID -> 注册处理器（或重新连接）后收到的第一条实时消息ID，补拉到这里为止
+        self._sync_epoch = 0   # 每次连接出现问题时加1，补拉过程中连接出现问题时不标记为已同步
+        
+        # 连接健康监控，连接恢复后补拉消息
+        self.health = HealthMonitor(
+            self.client,
+            on_reconnected=self._on_reconnected,
+            on_connection_lost=self._on_connection_lost,
+            idle_timeout=HEALTH_IDLE_TIMEOUT,
+            ping_timeout=HEALTH_PING_TIMEOUT,
+            check_interval=HEALTH_CHECK_INTERVAL,
+            channels=self._watched_channels,
+            channel_probe_interval=HEALTH_CHANNEL_PROBE_INTERVAL
+        )
+        
+        # 消息输出，默认写入JSONL文件，打印到标准输出需要在配置中开启
+        self.sinks = []
+        sink_options = dict(
+            maxsize=OUTPUT_BUFFER_SIZE,
+            overflow_policy=OUTPUT_OVERFLOW_POLICY,
+            flush_interval=OUTPUT_FLUSH_INTERVAL
+        )
+        if OUTPUT_JSONL_PATH:
+            self.sinks.append(JsonlFileSink(
+                OUTPUT_JSONL_PATH,
+                max_bytes=OUTPUT_MAX_BYTES,
+                backup_count=OUTPUT_BACKUP_COUNT,
+                **sink_options
+            ))
+        if OUTPUT_STDOUT_PRETTY:
+            self.sinks.append(StdoutSink(pretty=True, **sink_options))
+        if ARCHIVE_DIR:
+            # 归档按批压缩，间隔长一些每个数据块的记录更多，压缩率更高
+            self.sinks.append(ArchiveSink(
+                ARCHIVE_DIR,
+                segment_messages=ARCHIVE_SEGMENT_MESSAGES,
+                fts=ARCHIVE_FTS,
+                maxsize=OUTPUT_BUFFER_SIZE,
+                overflow_policy=OUTPUT_OVERFLOW_POLICY,
+                flush_interval=ARCHIVE_FLUSH_INTERVAL
+            ))
+        
+        # 转发流程各阶段的耗时和计数
+        self.metrics = MetricsRegistry()
+        self._init_metrics()
+
+    def _init_metrics(self):
+        """
+        注册转发流程指标，热路径上用到的子指标提前取出，记录时只需一次方法调用
+        """
+        metrics = self.metrics
+        stage_seconds = metrics.histogram(
+            "stage_seconds",
+            "各阶段耗时（秒）: receive=Telegram消息时间到收到更新, sender=解析发送者, filter=路由过滤, "
+            "format=格式化, enqueue=放入发件箱或转发队列, qq_send=调用QQ接口, qq_ack=入队到QQ确认",
+            labelnames=("stage",)
+        )
+        self._stage_receive = stage_seconds.labels("receive")
+        self._stage_sender = stage_seconds.labels("sender")
+        self._stage_filter = stage_seconds.labels("filter")
+        self._stage_format = stage_seconds.labels("format")
+        self._stage_enqueue = stage_seconds.labels("enqueue")
+        self._stage_qq_send = stage_seconds.labels("qq_send")
+        self._stage_qq_ack = stage_seconds.labels("qq_ack")
+        self._stage_media_download = stage_seconds.labels("media_download")
+        self._stage_media_upload = stage_seconds.labels("media_upload")
+        
+        self._messages_received = metrics.counter("messages_received_total", "监听群组收到的消息数量", labelnames=("group",))
+        self._messages_forwarded = metrics.counter("messages_forwarded_total", "放入转发流程的消息数量", labelnames=("group",))
+        self._messages_dropped = metrics.counter("messages_dropped_total", "未转发的消息数量", labelnames=("reason",))
+        self._send_failures = metrics.counter("qq_send_failures_total", "调用QQ接口失败的次数", labelnames=("target",))
+        
+        def per_target(deliveries, attr):
+            return lambda: {(target,): getattr(queue, attr) for target, queue in deliveries.items()}
+        
+        metrics.gauge("delivery_queue_depth", "转发队列中等待发送的消息数量",
+                      per_target(self.deliveries, "depth"), labelnames=("target",))
+        metrics.counter_func("delivery_sent_total", "发送成功的原始消息数量",
+                             per_target(self.deliveries, "sent"), labelnames=("target",))
+        metrics.counter_func("delivery_posts_total", "实际发出的QQ消息数量（合并后）",
+                             per_target(self.deliveries, "posts"), labelnames=("target",))
+        metrics.counter_func("delivery_replaced_total", "发送前被替换为编辑版本的消息数量",
+                             per_target(self.deliveries, "replaced"), labelnames=("target",))
+        metrics.gauge("media_queue_depth", "媒体转发队列中等待发送的消息数量",
+                      per_target(self.media_deliveries, "depth"), labelnames=("target",))
+        metrics.counter_func("media_downloads_total", "下载的媒体文件数量",
+                             lambda: self.media_spool.downloads if self.media_spool is not None else None)
+        metrics.counter_func("media_cache_hits_total", "同一文件无需重新下载的次数",
+                             lambda: self.media_spool.cache_hits if self.media_spool is not None else None)
+        metrics.gauge("media_bytes_in_flight", "正在下载的媒体文件总大小（字节）",
+                      lambda: self.media_spool.get_stats()["bytes_in_flight"] if self.media_spool is not None else None)
+        metrics.gauge("outbox_in_flight", "发件箱中尚未确认的消息数量",
+                      lambda: self.outbox.get_stats()["in_flight"] if self.outbox is not None else None)
+        metrics.gauge("edit_debounce_pending", "等待防抖窗口结束的编辑消息数量",
+                      lambda: self.edit_debouncer.get_stats()["pending"] if self.edit_debouncer is not None else None)
+        metrics.gauge("output_buffered", "消息输出缓冲区中等待写入的记录数量",
+                      lambda: sum(sink.get_stats()["buffered"] for sink in self.sinks))
+        metrics.counter_func("output_dropped_total", "消息输出缓冲区已满时丢弃的记录数量",
+                             lambda: sum(sink.dropped for sink in self.sinks))
+        metrics.gauge("content_filter_rules", "当前生效的内容过滤规则数量",
+                      lambda: self.content_filter.get_stats()["rules"] if self.content_filter is not None else None)
+        metrics.counter_func("content_filter_reloads_total", "重新加载内容过滤规则的次数",
+                             lambda: self.content_filter.reloads if self.content_filter is not None else None)
+        metrics.counter_func("dedup_checks_total", "参与去重检查的消息数量",
+                             lambda: self.dedup.checks if self.dedup is not None else None)
+        metrics.counter_func("dedup_hits_total", "被判定为重复而未转发的消息数量",
+                             lambda: self.dedup.hits if self.dedup is not None else None)
+        metrics.gauge("dedup_entries", "去重缓存中的指纹数量",
+                      lambda: len(self.dedup) if self.dedup is not None else None)
+        metrics.counter_func("entity_cache_hits_total", "实体缓存命中次数", lambda: self.entity_cache.hits)
+        metrics.counter_func("entity_cache_misses_total", "实体缓存未命中次数", lambda: self.entity_cache.misses)
+        metrics.gauge("telegram_rtt_seconds", "最近一次探测请求的往返时间", lambda: self.health.rtt)
+        metrics.gauge("telegram_last_update_age_seconds", "距离上次收到Telegram更新的时间",
+                      lambda: time.monotonic() - self.health.last_update_at)
+        metrics.counter_func("telegram_reconnects_total", "重新连接Telegram的次数", lambda: self.health.reconnects)
+        metrics.gauge("qq_connected", "是否已连接QQ机器人", lambda: int(self.qq.connected))
+        metrics.counter_func("qq_reconnects_total", "重新连接QQ机器人的次数", lambda: self.qq.reconnects)
+
+    def _observe_receive(self, message, edited=False):
+        """
+        记录从Telegram消息时间到收到更新的延迟（消息时间精度为秒）
+        """
+        sent_at = message.edit_date if edited and message.edit_date else message.date
+        if sent_at is not None:
+            self._stage_receive.observe(max(0.0, time.time() - sent_at.timestamp()))
+
+    def _reject_reason(self, message):
+        """
+        监听群组中的消息未通过过滤时的原因，只在过滤失败后调用
+        """
+        if not message.text and not self._has_forwardable_media(message):
+            return "no_content"
+        allowed_users = self.routes[message.chat_id]
+        if allowed_users is not None and message.sender_id not in allowed_users:
+            return "sender_filtered"
+        return "content_filtered"
 
     async def start_client(self):
         """
@@ -48,21 +287,175 @@ class TelegramMonitor:
         self.me = await self.client.get_me()
         logger.info(f"成功登录到账号 {self.me.first_name} (@{self.me.username})")
 
-    async def keep_alive(self):
+    def _on_connection_lost(self):
+        """
+        连接出现问题时，所有群组的补拉起点停止推进，直到重新连接后补拉完成
+        """
+        self._sync_epoch += 1
+        self._live_first = {}
+        self.checkpoints.desync()
+
+    async def _on_reconnected(self):
+        """
+        重新连接Telegram后，在后台补拉断线期间错过的消息
+        """
+        logger.info("与Telegram的连接已恢复，开始补拉错过的消息")
+        self._catch_up_task = asyncio.create_task(self.catch_up())
+
+    async def _on_raw_update(self, update):
+        """
+        收到任意更新时记录时间，供健康监控判断连接和各频道是否空闲
+        """
+        self.health.touch(update)
+
+    def _watched_channels(self):
+        """
+        监听的超级群和频道，供健康监控单独探测（普通群的更新在公共消息箱中，不需要单独探测）
+        """
+        channels = {}
+        for group_id in self.routes:
+            input_peer = self.snapshot.input_peer(group_id)
+            if isinstance(input_peer, InputPeerChannel):
+                channels[group_id] = input_peer
+        return channels
+
+    async def catch_up(self):
+        """
+        从补拉起点开始补拉各群组错过的新消息，按消息顺序走与实时消息相同的过滤和转发流程
+        没有检查点的群组（首次监听）不补拉；断线期间的消息编辑不会补发
+        正在补拉时再次调用，会在本轮结束后再补拉一轮
+        """
+        if self._catch_up_lock.locked():
+            self._catch_up_pending = True
+            return
+        async with self._catch_up_lock:
+            while True:
+                self._catch_up_pending = False
+                await self._catch_up_once()
+                if not self._catch_up_pending:
+                    break
+
+    async def _catch_up_once(self):
+        epoch = self._sync_epoch
+        semaphore = asyncio.Semaphore(CATCH_UP_CONCURRENCY)
+        
+        async def fetch(group_id, min_id):
+            """
+            按页补拉一个群组，页满时从本页最后一条消息继续；返回处理的消息数量
+            """
+            total = 0
+            async with semaphore:
+                while True:
+                    # reverse=True 从最早的消息开始按顺序返回，Telethon 内部按每页100条分页
+                    messages = [
+                        message async for message in self.client.iter_messages(
+                            self.snapshot.input_peer(group_id) or group_id,
+                            min_id=min_id, reverse=True, limit=CATCH_UP_LIMIT
+                        )
+                    ]
+                    reached_live = False
+                    for message in messages:
+                        # 注册处理器后收到的消息已经按实时消息处理过
+                        live_first = self._live_first.get(group_id)
+                        if live_first is not None and message.id >= live_first:
+                            reached_live = True
+                            break
+                        await self._process_new_message(message)
+                        total += 1
+                    if messages:
+                        min_id = messages[-1].id
+                        # 本页的消息都已处理（或已按实时消息处理），补拉起点可以推进到这里
+                        self.checkpoints.advance_floor(group_id, min(min_id, self._live_first.get(group_id, min_id)))
+                    if reached_live or len(messages) < CATCH_UP_LIMIT:
+                        return total
+        
+        floors = {}
+        for group_id in self.routes:
+            if self.checkpoints.is_synced(group_id):
+                continue
+            floor = self.checkpoints.floor(group_id)
+            if floor is None:
+                # 首次监听的群组没有需要补拉的消息
+                self.checkpoints.mark_synced(group_id)
+            else:
+                floors[group_id] = floor
+        if not floors:
+            return
+        
+        results = await asyncio.gather(
+            *(fetch(group_id, min_id) for group_id, min_id in floors.items()),
+            return_exceptions=True
+        )
+        
+        total = 0
+        for group_id, result in zip(floors, results):
+            if isinstance(result, Exception):
+                # 补拉起点保持不变，下次补拉（重新连接或重启）时重试
+                logger.error(f"补拉群组 {group_id} 的消息时出错，下次补拉时重试: {result}")
+                continue
+            total += result
+            if epoch == self._sync_epoch and group_id in self.routes:
+                self.checkpoints.mark_synced(group_id)
+        if total:
+            logger.info(f"补拉完成，共处理 {total} 条错过的消息")
+
+    async def get_entity(self, peer_id):
+        """
+        获取实体（用户或群组），优先使用缓存
+        """
+        entity = self.entity_cache.get(peer_id)
+        if entity is None:
+            entity = await self.client.get_entity(peer_id)
+            self.entity_cache.put(peer_id, entity)
+        return entity
+
+    async def resolve_group(self, group_id):
+        """
+        获取群组名称，优先使用本地快照，没有快照时才请求网络并写入快照
+        """
+        title = self.snapshot.title(group_id)
+        if title is None:
+            entity = await self.get_entity(group_id)
+            self.snapshot.update(group_id, entity)
+            title = entity.title
+        return title
+
+    async def refresh_snapshot(self):
         """
-        保持连接活跃
+        在后台逐个刷新快照中的群组信息（名称、access_hash），每次只刷新最久未更新的一个
         """
-        while self.is_monitoring:
+        while True:
+            group_ids = list(self.routes)
+            await asyncio.sleep(ENTITY_SNAPSHOT_REFRESH_INTERVAL / max(1, len(group_ids)))
+            group_id = self.snapshot.stalest(group_ids)
+            if group_id is None:
+                continue
             try:
-                # 定期获取自己的信息以保持连接活跃
-                await self.client.get_me()
-                # 获取一些群组信息以保持连接活跃
-                if self.target_group_ids:
-                    await self.client.get_entity(self.target_group_ids[0])
-                await asyncio.sleep(30)  # 每30秒执行一次
+                entity = await self.client.get_entity(self.snapshot.input_peer(group_id) or group_id)
+                self.entity_cache.put(group_id, entity)
+                self.snapshot.update(group_id, entity)
+                if entity.title != self.group_titles.get(group_id):
+                    self.group_titles[group_id] = entity.title
+                if self.snapshot.dirty:
+                    await self.snapshot.save_async()
             except Exception as e:
-                logger.warning(f"保持连接活跃时出错: {e}")
-                await asyncio.sleep(30)
+                logger.warning(f"刷新群组 {group_id} 的快照时出错: {e}")
+
+    async def get_sender(self, message):
+        """
+        获取消息发送者，优先使用缓存，每条消息只需解析一次
+        """
+        sender_id = message.sender_id
+        if sender_id is None:
+            return await message.get_sender()
+        
+        sender = self.entity_cache.get(sender_id)
+        if sender is None:
+            # 更新中通常已携带发送者信息，没有时才发起网络请求
+            sender = message.sender or await message.get_sender()
+            if sender is not None:
+                self.entity_cache.put(sender_id, sender)
+        return sender
 
     async def get_groups_list(self):
         """
@@ -103,23 +496,217 @@ class TelegramMonitor:
         
         return groups
 
-    def send_to_qq_group(self, message_text):
+    def get_delivery(self, target):
+        """
+        获取目标QQ群的文字消息转发队列，第一次使用时创建
+        """
+        queue = self.deliveries.get(target)
+        if queue is None:
+            queue = self.deliveries[target] = DeliveryQueue(
+                functools.partial(self._post_group_msg, target=target),
+                maxsize=DELIVERY_QUEUE_SIZE,
+                workers=DELIVERY_WORKERS,
+                overflow_policy=DELIVERY_OVERFLOW_POLICY,
+                on_drop=self._on_delivery_dropped,
+                rate_limiter=self._get_rate_limiter(target),
+                coalesce_max_chars=COALESCE_MAX_CHARS,
+                coalesce_max_items=COALESCE_MAX_ITEMS,
+                coalesce_max_wait=COALESCE_MAX_WAIT,
+                name=f"QQ群 {target} 转发队列"
+            )
+            if self._delivery_started:
+                queue.start()
+        return queue
+
+    def get_media_delivery(self, target):
+        """
+        获取目标QQ群的媒体转发队列，第一次使用时创建
+        媒体使用单独的队列，大文件的下载和上传不会阻塞后面的文字消息；与文字消息共用限速器
+        """
+        queue = self.media_deliveries.get(target)
+        if queue is None:
+            queue = self.media_deliveries[target] = DeliveryQueue(
+                functools.partial(self._post_group_media, target=target),
+                maxsize=MEDIA_QUEUE_SIZE,
+                workers=MEDIA_WORKERS,
+                overflow_policy=DELIVERY_OVERFLOW_POLICY,
+                on_drop=self._on_delivery_dropped,
+                rate_limiter=self._get_rate_limiter(target),
+                name=f"QQ群 {target} 媒体转发队列"
+            )
+            if self._delivery_started:
+                queue.start()
+        return queue
+
+    def _get_rate_limiter(self, target):
+        """
+        同一个QQ群的文字和媒体队列共用一个限速器
+        """
+        if not QQ_SEND_RATE:
+            return None
+        for queues in (self.deliveries, self.media_deliveries):
+            queue = queues.get(target)
+            if queue is not None:
+                return queue.rate_limiter
+        return TokenBucket(QQ_SEND_RATE, QQ_SEND_BURST)
+
+    def start_delivery(self):
+        """
+        启动所有目标QQ群的转发队列，之后新建的队列会立即启动
+        """
+        self._delivery_started = True
+        if self.media_spool is not None:
+            self.media_spool.start()
+        for queue in (*self.deliveries.values(), *self.media_deliveries.values()):
+            queue.start()
+
+    async def stop_delivery(self):
         """
-        将消息发送到QQ群
+        停止所有转发队列，停止前尽量发送完剩余的消息
+        """
+        self._delivery_started = False
+        await asyncio.gather(*(queue.stop() for queue in self.deliveries.values()))
+        await asyncio.gather(*(queue.stop() for queue in self.media_deliveries.values()))
+
+    async def send_to_qq_group(self, message_text, handoff=None, target=None):
+        """
+        将消息放入QQ转发队列，由转发队列的工作协程异步发送，不阻塞事件循环
+        启用发件箱时先写入发件箱，落盘后再进入转发队列
         
         Args:
             message_text (str): 要发送的消息文本
+            handoff (Handoff): 对应的Telegram消息，用于发件箱去重
+            target (int): 目标QQ群号，为None时发往默认的QQ群
+        """
+        if target is None:
+            target = self.qq_target_group
+        if self.outbox is not None and handoff is not None:
+            self.outbox.add(handoff.chat_id, handoff.message_id, handoff.edit_date, message_text, target)
+        else:
+            item = DeliveryItem(text=message_text)
+            if handoff is not None:
+                item.source_chat_id = handoff.chat_id
+                item.message_id = handoff.message_id
+            await self.get_delivery(target).put(item)
+
+    async def _enqueue_from_outbox(self, outbox_id, chat_id, message_id, text, target):
+        """
+        发件箱中的消息落盘或到达重试时间后放入对应QQ群的转发队列
+        旧版本发件箱中的记录没有目标QQ群（为0），发往默认的QQ群
+        """
+        await self.get_delivery(target or self.qq_target_group).put(DeliveryItem(
+            text=text, outbox_id=outbox_id, source_chat_id=chat_id, message_id=message_id
+        ))
+
+    def _replace_pending(self, handoff, target):
+        """
+        同一条消息还在转发队列中等待发送时，替换为最新内容，避免再发一条
+        
+        Returns:
+            bool: 是否已替换
+        """
+        queue = self.deliveries.get(target)
+        if queue is None:
+            return False
+        item = queue.replace_pending((handoff.chat_id, handoff.message_id), handoff.text)
+        if item is None:
+            return False
+        if item.outbox_id is not None:
+            self.outbox.update_text(item.outbox_id, handoff.text)
+        return True
+
+    def _on_delivery_dropped(self, item):
         """
+        转发队列已满丢弃消息时，发件箱中的消息稍后重试
+        """
+        self._messages_dropped.labels("queue_full").inc()
+        if item.outbox_id is not None:
+            self.outbox.mark_failed(item.outbox_id)
+
+    async def _post_group_msg(self, item, target):
+        """
+        实际发送消息到QQ群，由转发队列的工作协程调用，失败时抛出异常
+        
+        Args:
+            item (DeliveryItem): 要发送的消息
+            target (int): 目标QQ群号
+        """
+        # QQ机器人连接完成前在这里等待，后面的消息留在转发队列中
+        api = await self.qq.get_api()
+        started = time.perf_counter()
         try:
-            bot.api.post_group_msg_sync(group_id=QQ_TARGET_GROUP, text=message_text)
+            check_response(await api.post_group_msg(group_id=target, text=item.text))
         except Exception as e:
-            logger.error(f"发送QQ消息时出错: {e}")
+            self._send_failures.labels(target).inc()
+            self.qq.report_failure(e)
+            for part in item.iter_parts():
+                if part.outbox_id is not None:
+                    self.outbox.mark_failed(part.outbox_id)
+            raise
+        self.qq.report_success()
+        self._stage_qq_send.observe(time.perf_counter() - started)
+        # 合并发送时逐条标记原始消息
+        now = time.monotonic()
+        for part in item.iter_parts():
+            self._stage_qq_ack.observe(now - part.enqueued_at)
+            if part.outbox_id is not None:
+                self.outbox.mark_done(part.outbox_id)
+
+    async def _post_group_media(self, item, target):
+        """
+        下载媒体文件并通过 ncatbot 的文件接口发送到QQ群，由媒体转发队列的工作协程调用
 
-    async def format_message_as_json(self, message, group_title, is_edited=False):
+        Args:
+            item (DeliveryItem): 要发送的媒体，item.media 为对应的Telegram消息
+            target (int): 目标QQ群号
+        """
+        message = item.media
+        started = time.perf_counter()
+        path = await self.media_spool.fetch(message)
+        downloaded = time.perf_counter()
+        self._stage_media_download.observe(downloaded - started)
+        if path is None:
+            # 文件过大，文字说明已经转发
+            return
+        
+        path = os.path.abspath(path)
+        kind = media_kind(message)
+        api = await self.qq.get_api()
+        upload_started = time.perf_counter()
+        try:
+            if kind == MEDIA_FILE:
+                check_response(await api.send_group_file(
+                    group_id=target, file=path, name=message.file.name or os.path.basename(path)
+                ))
+            else:
+                check_response(await api.post_group_file(group_id=target, **{kind: path}))
+        except Exception as e:
+            self._send_failures.labels(target).inc()
+            self.qq.report_failure(e)
+            raise
+        self.qq.report_success()
+        self._stage_media_upload.observe(time.perf_counter() - upload_started)
+
+    def _has_forwardable_media(self, message):
+        """
+        消息是否包含需要转发的媒体；分片模式下的监听进程不下载媒体，但仍转发媒体的文字说明
+        """
+        if self.media_spool is None and self.shard_client is None:
+            return False
+        return media_kind(message) is not None
+
+    async def format_message_as_json(self, message, group_title, is_edited=False, sender=None):
         """
         将消息格式化为JSON格式
+        
+        Args:
+            message: Telegram消息
+            group_title (str): 群组名称
+            is_edited (bool): 是否为编辑消息
+            sender: 已解析的发送者，为None时重新获取
         """
-        sender = await message.get_sender()
+        if sender is None:
+            sender = await self.get_sender(message)
         
         # 获取发送者信息
         sender_info = {
@@ -151,6 +738,16 @@ class TelegramMonitor:
                 else:
                     sender_info["full_name"] = str(sender.id)
 
+        # 媒体信息
+        media_info = None
+        kind = media_kind(message)
+        if kind is not None:
+            media_info = {
+                "type": kind,
+                "name": message.file.name,
+                "size": message.file.size
+            }
+
         # 构建消息JSON
         message_json = {
             "timestamp": datetime.now().isoformat(),
@@ -164,167 +761,105 @@ class TelegramMonitor:
                 "text": message.text,
                 "date": message.date.isoformat() if message.date else None,
                 "edited": message.edit_date.isoformat() if message.edit_date else None,
-                "is_edited": is_edited
+                "is_edited": is_edited,
+                "media": media_info
             }
         }
         
         return message_json
 
-    async def monitor_groups_messages(self):
+    async def monitor_groups_messages(self, checkpoints=None):
         """
-        监听指定群组中指定用户的消息，并以JSON格式打印
+        监听指定群组中指定用户的消息，写入消息输出并转发到QQ群
+        
+        Args:
+            checkpoints (dict): 群组ID -> 消息ID，从这里开始补拉（分片模式下由转发进程提供其他进程处理过的进度）
         """
         if not self.target_group_ids:
             logger.error("未配置目标群组ID")
             return
 
         try:
-            # 获取群组信息
-            group_entities = {}
+            # 获取群组信息（优先使用本地快照）
+            group_titles = {}
             for group_id in self.target_group_ids:
                 try:
-                    entity = await self.client.get_entity(group_id)
-                    group_entities[group_id] = entity
-                    group_title = entity.title
+                    group_title = await self.resolve_group(group_id)
+                    group_titles[group_id] = group_title
                     print(f"\n开始监听群组 '{group_title}' (ID: {group_id}) 的消息...")
                 except Exception as e:
                     logger.error(f"无法获取群组 {group_id} 的信息: {e}")
                     continue
 
-            if not group_entities:
+            if not group_titles:
                 logger.error("无法获取任何目标群组的信息")
                 return
+            
+            if self.snapshot.dirty:
+                self.snapshot.save()
+
+            # 构建路由表
+            self.build_routes(group_titles)
+            if self.content_filter is not None:
+                self.content_filter.load()
 
             # 显示监听配置
-            print(f"监听的群组数量: {len(group_entities)}")
-            for group_id in self.target_group_ids:
-                group_title = group_entities[group_id].title
-                if group_id in self.target_user_ids and self.target_user_ids[group_id]:
-                    print(f"群组 '{group_title}' 监听的用户ID: {self.target_user_ids[group_id]}")
+            print(f"监听的群组数量: {len(group_titles)}")
+            for group_id, allowed_users in self.routes.items():
+                group_title = self.group_titles[group_id]
+                if allowed_users is not None:
+                    print(f"群组 '{group_title}' 监听的用户ID: {allowed_users}")
                 else:
                     print(f"群组 '{group_title}' 监听所有用户的消息")
+                targets = ", ".join(
+                    f"{target}" if allowed is None else f"{target} (用户ID: {allowed})"
+                    for target, allowed in self.fanout[group_id]
+                )
+                print(f"群组 '{group_title}' 转发到QQ群: {targets}")
+                rules = self.content_filter.get(group_id) if self.content_filter is not None else None
+                if rules is not None:
+                    print(f"群组 '{group_title}' 按内容过滤，共 {rules.rule_count} 条规则")
             print("按 Ctrl+C 可提前停止监听")
             print("提示: 为了确保能够接收实时消息，请保持手机端Telegram在线并打开需要监听的群组")
 
             # 设置监控状态
             self.is_monitoring = True
             
-            # 启动保持活跃任务
-            keep_alive_task = asyncio.create_task(self.keep_alive())
+            # 启动QQ转发队列和发件箱（发件箱启动时会重新发送上次未完成的消息）
+            self.start_delivery()
+            if self.outbox is not None:
+                await self.outbox.start()
+            if self.edit_debouncer is not None:
+                self.edit_debouncer.start()
+            for sink in self.sinks:
+                sink.start()
+            if self.content_filter is not None:
+                self.content_filter.start()
+            await self.metrics.start(METRICS_HOST, METRICS_PORT, log_interval=METRICS_LOG_INTERVAL)
 
-            # 定义处理新消息的回调函数
-            async def handler(event):
-                message = event.message
-                group_id = message.chat_id
-                
-                # 检查是否是指定监听的群组
-                if group_id not in group_entities:
-                    return
-                
-                # 如果消息没有文本内容，跳过
-                if not message.text:
-                    return
-                
-                # 获取发送者
-                sender = await message.get_sender()
-                
-                # 如果指定了特定用户，则检查发送者是否匹配
-                if group_id in self.target_user_ids and self.target_user_ids[group_id]:
-                    is_target_user = False
-                    if sender and isinstance(sender, User):
-                        # 检查ID是否匹配
-                        if sender.id in self.target_user_ids[group_id]:
-                            is_target_user = True
-                    
-                    # 如果不是目标用户，跳过
-                    if not is_target_user:
-                        return
+            # 加载检查点（必须在注册处理器之前，避免覆盖实时消息推进的检查点）
+            self.checkpoints.load()
+            for group_id, message_id in (checkpoints or {}).items():
+                self.checkpoints.advance_floor(group_id, message_id)
+            self.checkpoints.start()
 
-                # 格式化并打印消息
-                try:
-                    group_title = group_entities[group_id].title
-                    message_json = await self.format_message_as_json(message, group_title)
-                    # 以美化的JSON格式打印
-                    json_output = json.dumps(message_json, ensure_ascii=False, indent=2)
-                    print(json_output)
-                    
-                    # 转发消息到QQ群
-                    # 构造要发送的文本消息
-                    sender_name = message_json['sender']['full_name']
-                    message_text = message_json['message']['text']
-                    # 获取消息时间并格式化
-                    message_time = message_json['message']['date']
-                    formatted_time = self.format_message_time(message_time)
-                    
-                    message_type = "[编辑]" if message_json['message']['is_edited'] else "[发送]"
-                    formatted_message = f"{message_type}\n群组: {group_title}\n发送者: {sender_name}\n时间: {formatted_time}\n内容: {message_text}"
-                    self.send_to_qq_group(formatted_message)
-                except Exception as e:
-                    logger.error(f"格式化消息时出错: {e}")
+            # 所有群组共用一个新消息处理器和一个编辑消息处理器，由路由表分发
+            self.client.add_event_handler(self._on_new_message, events.NewMessage())
+            self.client.add_event_handler(self._on_message_edited, events.MessageEdited())
+            self.client.add_event_handler(self._on_raw_update, events.Raw())
             
-            # 定义处理编辑消息的回调函数
-            async def edit_handler(event):
-                message = event.message
-                group_id = message.chat_id
-                
-                # 检查是否是指定监听的群组
-                if group_id not in group_entities:
-                    return
-                
-                # 如果消息没有文本内容，跳过
-                if not message.text:
-                    return
-                
-                # 获取发送者
-                sender = await message.get_sender()
-                
-                # 如果指定了特定用户，则检查发送者是否匹配
-                if group_id in self.target_user_ids and self.target_user_ids[group_id]:
-                    is_target_user = False
-                    if sender and isinstance(sender, User):
-                        # 检查ID是否匹配
-                        if sender.id in self.target_user_ids[group_id]:
-                            is_target_user = True
-                    
-                    # 如果不是目标用户，跳过
-                    if not is_target_user:
-                        return
-
-                # 格式化并打印消息
-                try:
-                    group_title = group_entities[group_id].title
-                    message_json = await self.format_message_as_json(message, group_title, is_edited=True)
-                    # 以美化的JSON格式打印
-                    json_output = json.dumps(message_json, ensure_ascii=False, indent=2)
-                    print(json_output)
-                    
-                    # 转发消息到QQ群
-                    # 构造要发送的文本消息
-                    sender_name = message_json['sender']['full_name']
-                    message_text = message_json['message']['text']
-                    # 获取消息时间并格式化
-                    message_time = message_json['message']['edited'] or message_json['message']['date']
-                    formatted_time = self.format_message_time(message_time)
-                    
-                    formatted_message = f"[编辑]\n群组: {group_title}\n发送者: {sender_name}\n时间: {formatted_time}\n内容: {message_text}"
-                    self.send_to_qq_group(formatted_message)
-                except Exception as e:
-                    logger.error(f"格式化编辑消息时出错: {e}")
-                
-            # 为每个群组注册事件处理器
-            for group_id in self.target_group_ids:
-                self.client.add_event_handler(
-                    handler, 
-                    events.NewMessage(chats=group_id)
-                )
-                # 注册编辑消息事件处理器
-                self.client.add_event_handler(
-                    edit_handler,
-                    events.MessageEdited(chats=group_id)
-                )
+            # 补拉上次运行结束后错过的消息
+            await self.catch_up()
             
-            # 保持监听
-            await self.client.run_until_disconnected()
+            # 在后台逐步刷新群组快照
+            self._snapshot_task = asyncio.create_task(self.refresh_snapshot())
+            
+            if self._started_at is not None:
+                qq_state = "已连接" if self.qq.connected else "仍在连接中，消息暂存在转发队列"
+                logger.info(f"启动完成，用时 {time.perf_counter() - self._started_at:.2f} 秒，QQ机器人{qq_state}")
+            
+            # 保持监听，由健康监控负责检测断线、更新流停滞并重新连接
+            await self.health.run()
                 
         except KeyboardInterrupt:
             print("\n用户中断监听")
@@ -334,27 +869,351 @@ class TelegramMonitor:
             self.is_monitoring = False
         finally:
             self.is_monitoring = False
+            if self._snapshot_task is not None:
+                self._snapshot_task.cancel()
+            if self.edit_debouncer is not None:
+                await self.edit_debouncer.stop()
+            await self.stop_delivery()
+            if self.media_spool is not None:
+                logger.info(f"媒体下载统计: {self.media_spool.get_stats()}")
+            if self.outbox is not None:
+                await self.outbox.stop()
+            await self.checkpoints.stop()
+            if self.content_filter is not None:
+                await self.content_filter.stop()
+            for sink in self.sinks:
+                await sink.stop()
+                logger.info(f"消息输出 {sink.name} 统计: {sink.get_stats()}")
+            await self.metrics.stop()
+            logger.info(f"转发流程指标: {self.metrics.summary()}")
+            logger.info(f"实体缓存统计: {self.entity_cache.get_stats()}")
+            if self.dedup is not None:
+                logger.info(f"去重统计: {self.dedup.get_stats()}")
+            logger.info(f"连接健康统计: {self.health.get_stats()}")
+            logger.info(f"QQ机器人连接统计: {self.qq.get_stats()}")
+
+    async def update_groups(self, monitor_groups, checkpoints=None):
+        """
+        监听过程中更换监听的群组（分片模式下由转发进程重新分配），新的群组从给定的检查点开始补拉
+        
+        Args:
+            monitor_groups (dict): 群组ID -> 用户ID字符串，格式同 MONITOR_GROUPS
+            checkpoints (dict): 群组ID -> 消息ID
+        """
+        self.target_group_ids = []
+        self.target_user_ids = {}
+        self.load_monitor_config(monitor_groups)
+        group_titles = {}
+        for group_id in self.target_group_ids:
+            try:
+                group_titles[group_id] = await self.resolve_group(group_id)
+            except Exception as e:
+                logger.error(f"无法获取群组 {group_id} 的信息: {e}")
+        if self.snapshot.dirty:
+            self.snapshot.save()
+        # 整体替换路由表，正在处理的消息不会看到只更新了一半的路由
+        previous = set(self.routes)
+        self.build_routes(group_titles)
+        # 新分配的群组在补拉完成前不推进补拉起点
+        added = set(self.routes) - previous
+        self.checkpoints.desync(added)
+        for group_id in added:
+            self._live_first.pop(group_id, None)
+        for group_id, message_id in (checkpoints or {}).items():
+            if group_id in added:
+                self.checkpoints.advance_floor(group_id, message_id)
+        logger.info(f"监听的群组已更新，共 {len(group_titles)} 个")
+        await self.catch_up()
+
+    def build_routes(self, group_titles):
+        """
+        根据群组和用户配置构建路由表
+        
+        Args:
+            group_titles (dict): 群组ID -> 群组名称
+        """
+        qq_routes = {int(group_id): targets for group_id, targets in QQ_ROUTES.items()}
+        routes = {}
+        fanout = {}
+        for group_id in group_titles:
+            user_ids = self.target_user_ids.get(group_id)
+            # 未指定用户时为None，表示监听所有用户
+            routes[group_id] = user_ids if user_ids else None
+            fanout[group_id] = self.parse_targets(qq_routes.get(group_id))
+        self.group_titles = dict(group_titles)
+        self.routes = routes
+        self.fanout = fanout
+        
+        # 提前创建每个目标QQ群的转发队列（分片模式下的监听进程不直接发送）
+        if self.shard_client is not None:
+            return
+        for targets in fanout.values():
+            for target, _ in targets:
+                self.get_delivery(target)
+                if self.media_spool is not None:
+                    self.get_media_delivery(target)
+
+    def parse_targets(self, entries):
+        """
+        解析一个群组的目标QQ群配置
+        
+        Args:
+            entries: QQ_ROUTES 中的一项，元素为QQ群号，或 {"qq_group": QQ群号, "users": 用户ID字符串}；为空时发往默认的QQ群
+        
+        Returns:
+            tuple: ((QQ群号, 允许的用户ID集合或None), ...)
+        """
+        if not entries:
+            return ((self.qq_target_group, None),)
+        targets = []
+        for entry in entries:
+            if isinstance(entry, dict):
+                user_ids_input = str(entry.get("users") or "").strip()
+                user_ids = self.parse_input_ids(user_ids_input) if user_ids_input else None
+                targets.append((int(entry["qq_group"]), user_ids or None))
+            else:
+                targets.append((int(entry), None))
+        return tuple(targets)
+
+    def match_targets(self, message):
+        """
+        返回消息需要发往的QQ群号列表
+        """
+        sender_id = message.sender_id
+        return [
+            target for target, allowed_users in self.fanout.get(message.chat_id, ())
+            if allowed_users is None or sender_id in allowed_users
+        ]
+
+    def match_route(self, message):
+        """
+        判断消息是否需要转发，只做本地查找和文本匹配，不发起任何网络请求
+        """
+        try:
+            allowed_users = self.routes[message.chat_id]
+        except KeyError:
+            return False
+        
+        # 如果消息既没有文本内容也没有可转发的媒体，跳过
+        if not message.text and not self._has_forwardable_media(message):
+            return False
+        
+        # 使用原始的发送者ID过滤，无需先获取发送者实体
+        if allowed_users is not None and message.sender_id not in allowed_users:
+            return False
+        
+        # 按内容过滤，所有关键词和正则只需扫描一遍文本
+        if self.content_filter is not None:
+            rules = self.content_filter.get(message.chat_id)
+            if rules is not None:
+                return rules.matches(message.text)
+        return True
+
+    async def _on_new_message(self, event):
+        """
+        新消息处理器
+        """
+        # 未监听的会话直接返回，不经过任何 await
+        if event.chat_id not in self.routes:
+            return
+        message = event.message
+        self._observe_receive(message)
+        self._live_first.setdefault(message.chat_id, message.id)
+        await self._process_new_message(message)
+
+    async def _process_new_message(self, message):
+        """
+        过滤并转发新消息，然后推进所在群组的检查点
+        """
+        # 先判断路由，过滤阶段的耗时只统计监听的群组
+        if message.chat_id not in self.routes:
+            return
+        started = time.perf_counter()
+        matched = self.match_route(message)
+        self._stage_filter.observe(time.perf_counter() - started)
+        if matched:
+            await self._forward_message(message)
+        self._messages_received.labels(message.chat_id).inc()
+        if not matched:
+            self._messages_dropped.labels(self._reject_reason(message)).inc()
+        self.checkpoints.update(message.chat_id, message.id)
+
+    async def _on_message_edited(self, event):
+        """
+        编辑消息处理器
+        """
+        message = event.message
+        if message.chat_id not in self.routes:
+            return
+        self._observe_receive(message, edited=True)
+        started = time.perf_counter()
+        matched = self.match_route(message)
+        self._stage_filter.observe(time.perf_counter() - started)
+        if not matched:
+            self._messages_dropped.labels(self._reject_reason(message)).inc()
+            return
+        if self.edit_debouncer is not None:
+            # 窗口内的多次编辑只转发最后一个版本
+            self.edit_debouncer.submit((message.chat_id, message.id), message)
+        else:
+            await self._forward_edited_message(message)
+
+    async def _forward_edited_message(self, message):
+        """
+        转发编辑后的消息
+        """
+        await self._forward_message(message, is_edited=True)
+
+    async def _forward_message(self, message, is_edited=False):
+        """
+        格式化消息，交给转发流程（同一进程内直接转发，分片模式下发给转发进程）
+        """
+        try:
+            targets = self.match_targets(message)
+            if not targets:
+                self._messages_dropped.labels("no_target").inc()
+                return
+            group_title = self.group_titles[message.chat_id]
+            # 获取发送者（整个处理流程只解析一次）
+            started = time.perf_counter()
+            sender = await self.get_sender(message)
+            resolved = time.perf_counter()
+            self._stage_sender.observe(resolved - started)
+            message_json = await self.format_message_as_json(message, group_title, is_edited=is_edited, sender=sender)
+            
+            # 转发消息到QQ群
+            # 构造要发送的文本消息
+            sender_name = message_json['sender']['full_name']
+            message_text = message_json['message']['text']
+            media_info = message_json['message']['media']
+            if media_info is not None:
+                message_text = f"{MEDIA_LABELS[media_info['type']]} {message_text or ''}".rstrip()
+            # 获取消息时间并格式化，编辑消息优先使用编辑时间
+            if is_edited:
+                message_time = message_json['message']['edited'] or message_json['message']['date']
+            else:
+                message_time = message_json['message']['date']
+            formatted_time = self.format_message_time(message_time)
+            
+            message_type = "[编辑]" if is_edited else "[发送]"
+            formatted_message = f"{message_type}\n群组: {group_title}\n发送者: {sender_name}\n时间: {formatted_time}\n内容: {message_text}"
+            self._stage_format.observe(time.perf_counter() - resolved)
+            
+            handoff = Handoff(
+                chat_id=message.chat_id,
+                message_id=message.id,
+                text=formatted_message,
+                record=message_json,
+                targets=targets,
+                edit_date=message.edit_date,
+                is_edited=is_edited
+            )
+            if self.dedup is not None:
+                self._set_dedup_keys(handoff, message)
+            # 媒体文件跟在文字说明之后，由媒体转发队列下载和发送；编辑消息不重复发送媒体
+            if media_info is not None and not is_edited and self.media_spool is not None:
+                handoff.media = message
+                handoff.media_label = MEDIA_LABELS[media_info['type']]
+            if self.shard_client is not None:
+                await self.shard_client.send_handoff(handoff)
+            else:
+                await self.deliver(handoff)
+        except Exception as e:
+            self._messages_dropped.labels("error").inc()
+            if is_edited:
+                logger.error(f"格式化编辑消息时出错: {e}")
+            else:
+                logger.error(f"格式化消息时出错: {e}")
+
+    async def deliver(self, handoff):
+        """
+        写入消息输出，然后放入每个目标QQ群的转发队列；分片模式下由转发进程对每个监听进程发来的消息调用
+        
+        Returns:
+            bool: 是否已转发（与已转发的消息重复时为False）
+        """
+        if self.dedup is not None and handoff.message_key is not None and self._is_duplicate(handoff):
+            self._messages_dropped.labels("duplicate").inc()
+            return False
+        started = time.perf_counter()
+        # 交给消息输出的后台写入协程，序列化和写入不在事件循环中进行
+        for sink in self.sinks:
+            await sink.put(handoff.record)
+        # 消息只格式化一次，发往每个目标QQ群
+        for target in handoff.targets:
+            # 原消息（或上一次编辑）还没发出去时，直接替换为最新内容
+            if not (handoff.is_edited and self._replace_pending(handoff, target)):
+                await self.send_to_qq_group(handoff.text, handoff, target)
+            if handoff.media is not None:
+                await self.get_media_delivery(target).put(DeliveryItem(
+                    text=handoff.media_label,
+                    source_chat_id=handoff.chat_id,
+                    message_id=handoff.message_id,
+                    media=handoff.media
+                ))
+        self._stage_enqueue.observe(time.perf_counter() - started)
+        self._messages_forwarded.labels(handoff.chat_id).inc()
+        return True
+
+    def _set_dedup_keys(self, handoff, message):
+        """
+        计算跨群组去重的指纹；编辑消息只需要消息本身的指纹
+        """
+        handoff.message_key = fingerprint("message", message.chat_id, message.id)
+        if not handoff.is_edited:
+            media = media_key(message) if media_kind(message) is not None else None
+            handoff.dedup_keys = message_keys(message.text, forward_origin(message), media)
+
+    def _is_duplicate(self, handoff):
+        """
+        判断消息是否与时间窗口内其他群组已转发的消息重复；被去重的消息之后的编辑也不再转发
+        """
+        if handoff.is_edited:
+            return handoff.message_key in self.dedup
+        if not self.dedup.seen(handoff.dedup_keys, handoff.chat_id):
+            return False
+        self.dedup.add(handoff.message_key)
+        return True
 
     def parse_input_ids(self, input_str):
         """
         解析用户输入的ID字符串，支持逗号分隔和范围
+        
+        Returns:
+            IntervalSet: 合并后的ID区间集合，范围不会被展开成逐个ID
         """
-        ids = []
+        intervals = []
         parts = input_str.split(',')
         for part in parts:
             part = part.strip()
             if part.isdigit() or (part.startswith('-') and part[1:].isdigit()):
-                ids.append(int(part))
+                intervals.append((int(part), int(part)))
             elif '-' in part:
                 # 处理范围格式，如 "1-5"
                 try:
                     start, end = map(int, part.split('-'))
-                    ids.extend(range(start, end + 1))
+                    if start > end:
+                        raise ValueError
+                    intervals.append((start, end))
                 except ValueError:
                     logger.warning(f"无效的ID范围格式: {part}")
             else:
                 logger.warning(f"无效的ID格式: {part}")
-        return ids
+        return IntervalSet(intervals)
+
+    def load_monitor_config(self, monitor_groups):
+        """
+        从配置加载要监听的群组和用户（无交互模式）
+        
+        Args:
+            monitor_groups (dict): 群组ID -> 用户ID字符串（格式与交互输入相同，空字符串表示所有用户）
+        """
+        for group_id, user_ids_input in monitor_groups.items():
+            group_id = int(group_id)
+            self.target_group_ids.append(group_id)
+            user_ids_input = str(user_ids_input or "").strip()
+            self.target_user_ids[group_id] = self.parse_input_ids(user_ids_input) if user_ids_input else IntervalSet()
+        logger.info(f"已从配置加载 {len(self.target_group_ids)} 个监听群组")
 
     def format_message_time(self, message_time):
         """
@@ -377,9 +1236,19 @@ class TelegramMonitor:
         """
         运行主程序
         """
+        self._started_at = time.perf_counter()
         try:
-            # 启动客户端
+            # QQ机器人在后台连接，同时启动Telegram客户端
+            self.qq.start()
             await self.start_client()
+            logger.info(f"Telegram客户端启动用时 {time.perf_counter() - self._started_at:.2f} 秒")
+            self.snapshot.load()
+            
+            # 配置了 MONITOR_GROUPS 时直接开始监听，不获取群组列表也不等待输入
+            if MONITOR_GROUPS:
+                self.load_monitor_config(MONITOR_GROUPS)
+                await self.monitor_groups_messages()
+                return
             
             # 显示群组列表
             groups = await self.list_groups_formatted()
@@ -421,8 +1290,7 @@ class TelegramMonitor:
             # 为每个群组询问需要监听的用户ID
             print("\n将为每个群组分别设置监听用户")
             for group_id in self.target_group_ids:
-                group_entity = await self.client.get_entity(group_id)
-                group_title = group_entity.title
+                group_title = await self.resolve_group(group_id)
                 
                 print(f"\n群组: {group_title} (ID: {group_id})")
                 print("请输入要监听的用户ID（多个ID用逗号分隔），直接回车表示监听所有用户:")
@@ -436,15 +1304,14 @@ class TelegramMonitor:
                         self.target_user_ids[group_id] = user_ids
                     except Exception as e:
                         print(f"处理用户ID时出错: {e}")
-                        self.target_user_ids[group_id] = []
+                        self.target_user_ids[group_id] = IntervalSet()
                 else:
-                    self.target_user_ids[group_id] = []
+                    self.target_user_ids[group_id] = IntervalSet()
             
             print(f"\n配置完成:")
             print(f"监听群组数量: {len(self.target_group_ids)}")
             for group_id in self.target_group_ids:
-                group_entity = await self.client.get_entity(group_id)
-                group_title = group_entity.title
+                group_title = await self.resolve_group(group_id)
                 if group_id in self.target_user_ids and self.target_user_ids[group_id]:
                     print(f"群组 '{group_title}' 监听用户ID: {self.target_user_ids[group_id]}")
                 else:
@@ -458,6 +1325,7 @@ class TelegramMonitor:
         except Exception as e:
             logger.error(f"运行时出错: {e}")
         finally:
+            await self.qq.stop()
             await self.client.disconnect()
 
 
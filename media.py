@@ -0,0 +1,225 @@
+"""
+媒体文件下载
+图片、语音、视频和文件按块流式下载到本地目录，不会把整个文件读入内存。
+同时下载的文件数量和总字节数都有上限；同一个 Telegram 文件只下载一次，
+下载好的文件按最近使用顺序保留在目录中，超过容量时删除最久未使用的文件。
+"""
+
+import asyncio
+import logging
+import os
+import re
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from telethon.tl.types import MessageMediaPhoto, MessageMediaDocument
+
+logger = logging.getLogger(__name__)
+
+# 媒体类型，与 ncatbot post_group_file 的参数名一致
+MEDIA_IMAGE = "image"
+MEDIA_RECORD = "record"
+MEDIA_VIDEO = "video"
+MEDIA_FILE = "file"
+
+# 下载目录中由本程序创建的文件: photo_<ID><扩展名> / document_<ID><扩展名>，以及下载中的 .part 文件
+_SPOOL_FILE = re.compile(r"(photo|document)_-?\d+(\.\w+)?(\.part)?")
+
+MEDIA_LABELS = {
+    MEDIA_IMAGE: "[图片]",
+    MEDIA_RECORD: "[语音]",
+    MEDIA_VIDEO: "[视频]",
+    MEDIA_FILE: "[文件]",
+}
+
+
+def media_kind(message):
+    """
+    返回消息中可以转发的媒体类型，没有时返回None
+    """
+    # 只处理消息本身的媒体，不包括链接预览中的图片
+    media = getattr(message, "media", None)
+    if isinstance(media, MessageMediaPhoto):
+        return MEDIA_IMAGE if media.photo is not None else None
+    if not isinstance(media, MessageMediaDocument) or media.document is None:
+        return None
+    document = media.document
+    if message.voice is not None:
+        return MEDIA_RECORD
+    if message.video is not None or message.gif is not None:
+        return MEDIA_VIDEO
+    if message.sticker is not None:
+        # 静态贴纸为 webp 图片，动态贴纸QQ无法显示
+        return MEDIA_IMAGE if document.mime_type == "image/webp" else None
+    return MEDIA_FILE
+
+
+def media_key(message):
+    """
+    Telegram 文件的唯一标识，同一个文件被多次转发时相同
+    """
+    if isinstance(message.media, MessageMediaPhoto):
+        return ("photo", message.media.photo.id)
+    return ("document", message.media.document.id)
+
+
+class MediaSpool:
+    def __init__(self, client, directory, max_concurrent=2, max_bytes_in_flight=200 * 1024 * 1024,
+                 max_file_size=100 * 1024 * 1024, cache_max_bytes=1024 * 1024 * 1024, chunk_size=512 * 1024):
+        """
+        初始化媒体下载目录
+
+        Args:
+            client (TelegramClient): Telegram客户端
+            directory (str): 下载目录
+            max_concurrent (int): 同时下载的文件数量
+            max_bytes_in_flight (int): 同时下载的文件总大小上限（字节），单个文件超过上限时等其他下载完成后单独下载
+            max_file_size (int): 超过该大小的文件不下载（字节）
+            cache_max_bytes (int): 目录中保留的文件总大小（字节）
+            chunk_size (int): 每次请求的块大小（字节），必须是4096的倍数，最大512KB
+        """
+        self.client = client
+        self.directory = directory
+        self.max_bytes_in_flight = max_bytes_in_flight
+        self.max_file_size = max_file_size
+        self.cache_max_bytes = cache_max_bytes
+        self.chunk_size = chunk_size
+
+        # 文件写入在单独的线程中执行，不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="media")
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._budget = asyncio.Condition()
+        self._bytes_in_flight = 0
+
+        self._cache = OrderedDict()  # 文件标识 -> (本地路径, 大小)，按最近使用顺序排列
+        self._cache_bytes = 0
+        self._downloading = {}       # 文件标识 -> 正在进行的下载任务
+
+        # 统计
+        self.downloads = 0
+        self.cache_hits = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_downloaded = 0
+
+    def start(self):
+        """
+        创建下载目录，并清理上次运行留下的文件（缓存只在内存中记录）
+        只删除本程序下载的文件，下载目录被设为共用的目录时不会误删其他文件
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not _SPOOL_FILE.fullmatch(name) or not os.path.isfile(path):
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    async def fetch(self, message):
+        """
+        下载消息中的媒体文件
+
+        Returns:
+            str: 本地文件路径，文件超过大小限制时返回None
+        """
+        key = media_key(message)
+        size = message.file.size or 0
+        if size > self.max_file_size:
+            self.skipped += 1
+            logger.info(f"媒体文件过大 ({size} 字节)，跳过下载")
+            return None
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached[0]
+
+        task = self._downloading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._download(message, key, size))
+            self._downloading[key] = task
+            task.add_done_callback(lambda _: self._downloading.pop(key, None))
+        else:
+            self.cache_hits += 1
+        # 调用方被取消时不影响正在进行的下载，其他等待同一文件的调用方仍可使用
+        return await asyncio.shield(task)
+
+    def get_stats(self):
+        """
+        获取下载统计信息
+        """
+        return {
+            "downloads": self.downloads,
+            "cache_hits": self.cache_hits,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "bytes_downloaded": self.bytes_downloaded,
+            "bytes_in_flight": self._bytes_in_flight,
+            "cached_files": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+        }
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _reserve(self, size):
+        async with self._budget:
+            await self._budget.wait_for(
+                lambda: self._bytes_in_flight == 0 or self._bytes_in_flight + size <= self.max_bytes_in_flight
+            )
+            self._bytes_in_flight += size
+
+    async def _release(self, size):
+        async with self._budget:
+            self._bytes_in_flight -= size
+            self._budget.notify_all()
+
+    async def _download(self, message, key, size):
+        kind, file_id = key
+        path = os.path.join(self.directory, f"{kind}_{file_id}{message.file.ext or ''}")
+        tmp_path = path + ".part"
+        written = 0
+        async with self._semaphore:
+            await self._reserve(size)
+            try:
+                f = await self._run(open, tmp_path, "wb")
+                try:
+                    async for chunk in self.client.iter_download(message.media, request_size=self.chunk_size):
+                        await self._run(f.write, chunk)
+                        written += len(chunk)
+                finally:
+                    await self._run(f.close)
+                await self._run(os.replace, tmp_path, path)
+            except BaseException:
+                self.failed += 1
+                await asyncio.shield(self._run(self._remove, tmp_path))
+                raise
+            finally:
+                await self._release(size)
+
+        self.downloads += 1
+        self.bytes_downloaded += written
+        self._cache[key] = (path, written)
+        self._cache_bytes += written
+        await self._evict()
+        return path
+
+    async def _evict(self):
+        """
+        超过容量时删除最久未使用的文件（至少保留刚下载的一个）
+        """
+        while self._cache_bytes > self.cache_max_bytes and len(self._cache) > 1:
+            _, (path, size) = self._cache.popitem(last=False)
+            self._cache_bytes -= size
+            await self._run(self._remove, path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
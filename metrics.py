@@ -0,0 +1,297 @@
+"""
+转发流程指标
+提供低开销的计数器和直方图（固定分桶，记录一次只是一次二分查找和几次加法），
+以 Prometheus 文本格式通过本地 HTTP 端口输出，并可以定期把摘要写入日志。
+"""
+
+import asyncio
+import logging
+import math
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+# 默认分桶（秒），覆盖从本地处理的微秒级到网络发送的数十秒
+DEFAULT_BUCKETS = (0.00001, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra is not None:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # 最后一个为 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """
+        根据分桶估算分位数（取所在分桶的上界）
+        """
+        if not self.count:
+            return None
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return math.inf
+
+
+class _Metric:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+
+    def labels(self, *values):
+        """
+        获取指定标签值的子指标，热路径上应提前获取并保存
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def render(self):
+        for values, child in self._children.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+    def summary(self):
+        return {",".join(map(str, values)) or "total": child.value for values, child in self._children.items()}
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def render(self):
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, ("le", _format_value(float(bound))))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+    def summary(self):
+        return {
+            ",".join(map(str, values)) or "all": {
+                "count": child.count,
+                "p50": child.quantile(0.50),
+                "p95": child.quantile(0.95),
+            }
+            for values, child in self._children.items()
+        }
+
+
+class Gauge(_Metric):
+    """
+    取值时调用回调函数，用于队列深度等已有的状态
+    有标签时回调函数返回 {标签值元组: 取值} 的字典
+    """
+    type = "gauge"
+
+    def __init__(self, name, documentation, func, type_="gauge", labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.func = func
+        self.type = type_
+
+    def render(self):
+        try:
+            value = self.func()
+        except Exception as e:
+            logger.warning(f"读取指标 {self.name} 时出错: {e}")
+            return
+        if value is None:
+            return
+        if not self.labelnames:
+            yield f"{self.name} {_format_value(value)}"
+            return
+        for values, child_value in value.items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child_value)}"
+
+    def summary(self):
+        try:
+            value = self.func()
+        except Exception:
+            return None
+        if self.labelnames and value is not None:
+            return {",".join(map(str, values)): child_value for values, child_value in value.items()}
+        return value
+
+
+class MetricsRegistry:
+    def __init__(self, namespace="tgforward"):
+        """
+        初始化指标注册表
+
+        Args:
+            namespace (str): 指标名称前缀
+        """
+        self.namespace = namespace
+        self._metrics = []
+        self._server = None
+        self._log_task = None
+
+    def _name(self, name):
+        return f"{self.namespace}_{name}" if self.namespace else name
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(self._name(name), documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(self._name(name), documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, documentation, func, labelnames=()):
+        metric = Gauge(self._name(name), documentation, func, labelnames=labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def counter_func(self, name, documentation, func, labelnames=()):
+        """
+        由回调函数提供取值的计数器（用于各模块已有的统计）
+        """
+        metric = Gauge(self._name(name), documentation, func, type_="counter", labelnames=labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        输出 Prometheus 文本格式
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """
+        所有指标的摘要，用于写入日志
+        """
+        prefix = len(self.namespace) + 1 if self.namespace else 0
+        return {metric.name[prefix:]: metric.summary() for metric in self._metrics}
+
+    async def start(self, host="127.0.0.1", port=0, log_interval=0):
+        """
+        启动 HTTP 指标端口和定期日志，必须在事件循环中调用
+
+        Args:
+            host (str): 监听地址
+            port (int): 监听端口，0表示不启动 HTTP 端口
+            log_interval (float): 定期写入日志的间隔（秒），0表示不写入
+        """
+        if port and self._server is None:
+            # 指标端口是可选的，端口被占用时只记录警告，转发照常进行
+            try:
+                self._server = await asyncio.start_server(self._handle_http, host, port)
+                logger.info(f"指标端口已启动: http://{host}:{port}/metrics")
+            except OSError as e:
+                logger.warning(f"无法启动指标端口 {host}:{port}，将不提供 HTTP 指标: {e}")
+        if log_interval and self._log_task is None:
+            self._log_task = asyncio.create_task(self._log_loop(log_interval))
+
+    async def stop(self):
+        if self._log_task is not None:
+            self._log_task.cancel()
+            await asyncio.gather(self._log_task, return_exceptions=True)
+            self._log_task = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_http(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # 读完请求头
+            while True:
+                line = await asyncio.wait_for(reader.readline(), timeout=5)
+                if not line or line in (b"\r\n", b"\n"):
+                    break
+            parts = request_line.decode("latin-1").split()
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] in ("/metrics", "/"):
+                body = self.render().encode("utf-8")
+                status = "200 OK"
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                body = b"not found\n"
+                status = "404 Not Found"
+                content_type = "text/plain; charset=utf-8"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode("latin-1") + body
+            )
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _log_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            logger.info(f"转发流程指标: {self.summary()}")
@@ -0,0 +1,314 @@
+"""
+持久化发件箱
+待转发的消息在发送前先写入 SQLite（WAL 模式），NapCat 确认后再标记为已完成。
+发送失败的消息按指数退避重试，程序重启后会重新发送未完成的消息。
+写入按批次合并为一个事务，突发流量下也只需要很少的 fsync。
+以 (chat_id, message_id, edit_date, target) 去重，重放时不会重复转发；同一条消息发往多个QQ群时每个群一条记录。
+"""
+
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# 消息状态
+STATUS_PENDING = 0
+STATUS_DONE = 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat_id INTEGER NOT NULL,
+    message_id INTEGER NOT NULL,
+    edit_date INTEGER NOT NULL DEFAULT 0,
+    target INTEGER NOT NULL DEFAULT 0,
+    text TEXT NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    done_at REAL,
+    UNIQUE (chat_id, message_id, edit_date, target)
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_pending ON outbox (status, next_attempt_at);
+"""
+
+# 旧版本的表没有 target 列，迁移后原有记录的 target 为0，表示发往默认的QQ群
+MIGRATE_ADD_TARGET = """
+BEGIN;
+DROP INDEX IF EXISTS idx_outbox_pending;
+ALTER TABLE outbox RENAME TO outbox_old;
+""" + SCHEMA + """
+INSERT INTO outbox (id, chat_id, message_id, edit_date, target, text, status, attempts, next_attempt_at, created_at, done_at)
+    SELECT id, chat_id, message_id, edit_date, 0, text, status, attempts, next_attempt_at, created_at, done_at FROM outbox_old;
+DROP TABLE outbox_old;
+COMMIT;
+"""
+
+
+class Outbox:
+    def __init__(self, path, on_ready, flush_interval=0.05, retry_interval=5,
+                 retry_base=2, retry_max=300, retention_days=7):
+        """
+        初始化发件箱
+
+        Args:
+            path (str): SQLite 数据库文件路径
+            on_ready: 消息落盘后（或需要重试时）调用的协程函数，参数为 (outbox_id, chat_id, message_id, text, target)
+            flush_interval (float): 批量写入的合并窗口（秒）
+            retry_interval (float): 检查待重试消息的间隔（秒）
+            retry_base (float): 指数退避的初始等待时间（秒）
+            retry_max (float): 指数退避的最长等待时间（秒）
+            retention_days (float): 已完成消息的保留天数，用于去重
+        """
+        self.path = path
+        self.on_ready = on_ready
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retention_days = retention_days
+
+        # 所有数据库操作都在同一个线程中执行，不阻塞事件循环
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+        self._conn = None
+        self._tasks = []
+        self._wakeup = None
+
+        # 等待下一次批量写入的操作
+        self._pending_inserts = []
+        self._pending_done = []
+        self._pending_failed = []
+        self._pending_updates = []
+
+        # 已交给转发队列、尚未得到结果的消息，避免重试时重复入队
+        self._in_flight = set()
+
+        # 统计
+        self.added = 0
+        self.duplicates = 0
+        self.done = 0
+        self.retried = 0
+        self.flushes = 0
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def start(self):
+        """
+        打开数据库并重新发送上次未完成的消息，必须在事件循环中调用
+        """
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        await self._run(self._open)
+        pending = await self._run(self._load_pending, None)
+        if pending:
+            logger.info(f"发件箱中有 {len(pending)} 条未完成的消息，重新发送")
+        for outbox_id, chat_id, message_id, text, target in pending:
+            self._in_flight.add(outbox_id)
+            await self.on_ready(outbox_id, chat_id, message_id, text, target)
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+        self._tasks.append(asyncio.create_task(self._retry_loop()))
+
+    async def stop(self):
+        """
+        写入剩余的操作并关闭数据库
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._conn is not None:
+            await self._flush()
+            await self._run(self._conn.close)
+            self._conn = None
+        logger.info(f"发件箱统计: {self.get_stats()}")
+
+    def add(self, chat_id, message_id, edit_date, text, target=0):
+        """
+        登记一条待转发的消息，立即返回；落盘后通过 on_ready 交给转发队列
+
+        Args:
+            chat_id (int): Telegram群组ID
+            message_id (int): Telegram消息ID
+            edit_date (datetime): 编辑时间，新消息为None
+            text (str): 要发送的消息文本
+            target (int): 目标QQ群号
+        """
+        edit_ts = int(edit_date.timestamp()) if edit_date else 0
+        self._pending_inserts.append((chat_id, message_id, edit_ts, target, text, time.time()))
+        self._wakeup.set()
+
+    def mark_done(self, outbox_id):
+        """
+        标记消息已被NapCat确认
+        """
+        self._pending_done.append(outbox_id)
+        self._wakeup.set()
+
+    def mark_failed(self, outbox_id):
+        """
+        标记消息发送失败，稍后按指数退避重试
+        """
+        self._pending_failed.append(outbox_id)
+        self._wakeup.set()
+
+    def update_text(self, outbox_id, text):
+        """
+        更新尚未发送的消息内容（例如发送前消息又被编辑）
+        """
+        self._pending_updates.append((text, outbox_id))
+        self._wakeup.set()
+
+    def get_stats(self):
+        """
+        获取发件箱统计信息
+        """
+        return {
+            "added": self.added,
+            "duplicates": self.duplicates,
+            "done": self.done,
+            "retried": self.retried,
+            "in_flight": len(self._in_flight),
+            "flushes": self.flushes,
+        }
+
+    async def _flush_loop(self):
+        """
+        合并一小段时间内的写入操作，在一个事务中提交
+        """
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"写入发件箱时出错: {e}")
+
+    async def _flush(self):
+        inserts, self._pending_inserts = self._pending_inserts, []
+        done, self._pending_done = self._pending_done, []
+        failed, self._pending_failed = self._pending_failed, []
+        updates, self._pending_updates = self._pending_updates, []
+        if not (inserts or done or failed or updates):
+            return
+
+        try:
+            ready = await self._run(self._write_batch, inserts, done, failed, updates)
+        except Exception:
+            # 放回去等待下一次写入
+            self._pending_inserts[:0] = inserts
+            self._pending_done[:0] = done
+            self._pending_failed[:0] = failed
+            self._pending_updates[:0] = updates
+            raise
+
+        self.flushes += 1
+        self.added += len(ready)
+        self.duplicates += len(inserts) - len(ready)
+        self.done += len(done)
+        # 状态写入后才允许重试循环再次取出这些消息
+        self._in_flight.difference_update(done)
+        self._in_flight.difference_update(failed)
+        for outbox_id, chat_id, message_id, text, target in ready:
+            self._in_flight.add(outbox_id)
+            await self.on_ready(outbox_id, chat_id, message_id, text, target)
+
+    async def _retry_loop(self):
+        """
+        定期取出已到重试时间的消息重新发送
+        """
+        while True:
+            await asyncio.sleep(self.retry_interval)
+            try:
+                rows = await self._run(self._load_pending, time.time())
+            except Exception as e:
+                logger.error(f"读取发件箱时出错: {e}")
+                continue
+            for outbox_id, chat_id, message_id, text, target in rows:
+                if outbox_id in self._in_flight:
+                    continue
+                self._in_flight.add(outbox_id)
+                self.retried += 1
+                await self.on_ready(outbox_id, chat_id, message_id, text, target)
+
+    # 以下方法在数据库线程中执行
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # WAL 模式下 NORMAL 只在检查点时 fsync，进程崩溃不会丢失已提交的数据
+        conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(outbox)")]
+        if columns and "target" not in columns:
+            logger.info("升级发件箱数据库: 增加目标QQ群列")
+            conn.executescript(MIGRATE_ADD_TARGET)
+        conn.executescript(SCHEMA)
+        if self.retention_days:
+            cutoff = time.time() - self.retention_days * 86400
+            conn.execute("DELETE FROM outbox WHERE status = ? AND done_at < ?", (STATUS_DONE, cutoff))
+        self._conn = conn
+
+    def _load_pending(self, now):
+        """
+        读取未完成的消息，now为None时读取全部
+        """
+        if now is None:
+            cursor = self._conn.execute(
+                "SELECT id, chat_id, message_id, text, target FROM outbox WHERE status = ? ORDER BY id",
+                (STATUS_PENDING,)
+            )
+        else:
+            cursor = self._conn.execute(
+                "SELECT id, chat_id, message_id, text, target FROM outbox WHERE status = ? AND next_attempt_at <= ? ORDER BY id LIMIT 500",
+                (STATUS_PENDING, now)
+            )
+        return cursor.fetchall()
+
+    def _write_batch(self, inserts, done, failed, updates):
+        """
+        在一个事务中写入一批操作，返回新插入（非重复）的消息
+        """
+        conn = self._conn
+        now = time.time()
+        ready = []
+        conn.execute("BEGIN")
+        try:
+            for chat_id, message_id, edit_ts, target, text, created_at in inserts:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO outbox (chat_id, message_id, edit_date, target, text, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (chat_id, message_id, edit_ts, target, text, created_at)
+                )
+                if cursor.rowcount:
+                    ready.append((cursor.lastrowid, chat_id, message_id, text, target))
+            if updates:
+                conn.executemany("UPDATE outbox SET text = ? WHERE id = ?", updates)
+            if done:
+                conn.executemany(
+                    "UPDATE outbox SET status = ?, done_at = ? WHERE id = ?",
+                    [(STATUS_DONE, now, outbox_id) for outbox_id in done]
+                )
+            for outbox_id in failed:
+                # 等待时间 = retry_base * 2^attempts，不超过 retry_max
+                row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+                conn.execute(
+                    "UPDATE outbox SET attempts = ?, next_attempt_at = ? WHERE id = ? AND status = ?",
+                    (attempts, now + delay, outbox_id, STATUS_PENDING)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return ready
@@ -0,0 +1,230 @@
+"""
+QQ机器人连接
+ncatbot 的 BotClient.run_blocking 会一直阻塞到连接上 NapCat 为止，这里把它放到后台线程中执行，
+Telegram 客户端可以同时启动；连接完成前转发队列的工作协程在 get_api 处等待，消息留在队列中。
+连续发生连接错误时关闭当前连接并在后台重新连接，无需重启进程；
+某个QQ群拒绝消息（被禁言、群不存在等）属于该群自己的错误，不会导致重新连接。
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 连接状态
+STATE_IDLE = "idle"
+STATE_CONNECTING = "connecting"
+STATE_CONNECTED = "connected"
+STATE_RECONNECTING = "reconnecting"
+
+
+class QQApiError(Exception):
+    """
+    QQ接口返回了失败的响应（例如被禁言、群不存在），连接本身正常
+    """
+
+
+def check_response(response):
+    """
+    检查 OneBot 接口的响应；ncatbot 调用失败时不会抛出异常，而是返回 status 不为 ok 的响应
+
+    Returns:
+        响应本身
+
+    Raises:
+        QQApiError: 响应表示调用失败
+    """
+    if isinstance(response, dict) and (response.get("status", "ok") != "ok" or response.get("retcode", 0) != 0):
+        raise QQApiError(f"{response.get('message') or response.get('wording') or '未知错误'} (retcode {response.get('retcode')})")
+    return response
+
+
+def is_transport_error(error):
+    """
+    是否为连接本身的错误（而不是某个QQ群拒绝了消息）
+    """
+    if isinstance(error, QQApiError):
+        return False
+    if isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError)):
+        return True
+    # websockets 等库的连接异常不一定继承 ConnectionError
+    name = type(error).__name__
+    return any(word in name for word in ("Connection", "WebSocket", "Timeout"))
+
+
+class QQBot:
+    def __init__(self, bt_uin, root, max_failures=3, retry_delay=5, reconnect_delay_max=300):
+        """
+        初始化QQ机器人连接，不会立即连接
+
+        Args:
+            bt_uin (str): 机器人登录的QQ号
+            root (str): 机器人管理员QQ号
+            max_failures (int): 连续发生多少次连接错误后重新连接
+            retry_delay (float): 连接失败后第一次重试前等待的时间（秒）
+            reconnect_delay_max (float): 连接失败时退避等待的上限（秒）
+        """
+        self.bt_uin = bt_uin
+        self.root = root
+        self.max_failures = max_failures
+        self.retry_delay = retry_delay
+        self.reconnect_delay_max = reconnect_delay_max
+
+        self.state = STATE_IDLE
+        self.api = None
+        self._bot = None
+        self._ready = None
+        self._task = None
+        self._failures = 0
+
+        # 统计
+        self.connects = 0
+        self.reconnects = 0
+        self.connect_seconds = None
+
+    def start(self):
+        """
+        在后台开始连接，已经连接或正在连接时不做任何事，必须在事件循环中调用
+        """
+        if self._ready is None:
+            self._ready = asyncio.Event()
+        if self.api is None and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._connect())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._bot is not None:
+            bot, self._bot, self.api = self._bot, None, None
+            await self._close_client(bot)
+
+    @property
+    def connected(self):
+        return self.api is not None
+
+    async def get_api(self):
+        """
+        获取 ncatbot 的 API 对象，尚未连接时先发起连接并等待连接完成
+        """
+        if self.api is None:
+            self.start()
+            await self._ready.wait()
+        return self.api
+
+    def report_success(self):
+        self._failures = 0
+
+    def report_failure(self, error):
+        """
+        调用QQ接口失败时调用，连续发生连接错误达到上限后在后台重新连接
+        只属于某个QQ群的错误不计入，一个群被禁言不会断开所有群共用的连接
+        """
+        if not is_transport_error(error):
+            return
+        self._failures += 1
+        if self._failures < self.max_failures or self.api is None:
+            return
+        logger.warning(f"QQ接口连续 {self._failures} 次连接错误，正在重新连接QQ机器人: {error}")
+        self.api = None
+        self._ready.clear()
+        self._failures = 0
+        self.state = STATE_RECONNECTING
+        self.start()
+
+    def get_stats(self):
+        """
+        获取QQ机器人连接统计信息
+        """
+        return {
+            "state": self.state,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "connect_seconds": round(self.connect_seconds, 2) if self.connect_seconds is not None else None,
+        }
+
+    def _run_blocking(self):
+        # 导入 ncatbot 本身也比较慢，放在后台线程中
+        from ncatbot.core import BotClient
+        bot = BotClient()
+        bot.run_blocking(bt_uin=self.bt_uin, root=self.root)
+        return bot
+
+    async def _close_client(self, bot):
+        """
+        关闭旧的 BotClient（连接和后台线程），重新连接时不会留下多个机器人实例
+        """
+        close = getattr(bot, "bot_exit", None)
+        if close is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.run_in_executor(None, close), timeout=10)
+        except Exception as e:
+            logger.warning(f"关闭旧的QQ机器人连接时出错: {e}")
+
+    async def _run_in_thread(self):
+        """
+        在守护线程中执行 run_blocking；连接一直没有完成时也不会阻止进程退出
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(result, error):
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+        def target():
+            try:
+                result, error = self._run_blocking(), None
+            except BaseException as e:
+                result, error = None, e
+            try:
+                loop.call_soon_threadsafe(set_result, result, error)
+            except RuntimeError:
+                # 事件循环已经关闭
+                pass
+
+        threading.Thread(target=target, name="qqbot-connect", daemon=True).start()
+        return await future
+
+    async def _connect(self):
+        """
+        连接QQ机器人，失败时按指数退避重试
+        """
+        reconnecting = self.connects > 0
+        if not reconnecting:
+            self.state = STATE_CONNECTING
+        if self._bot is not None:
+            bot, self._bot = self._bot, None
+            await self._close_client(bot)
+        logger.info("正在连接QQ机器人...")
+        delay = self.retry_delay
+        while True:
+            started = time.perf_counter()
+            try:
+                bot = await self._run_in_thread()
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"连接QQ机器人失败，{delay} 秒后重试: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_delay_max)
+
+        self.connect_seconds = time.perf_counter() - started
+        self.connects += 1
+        if reconnecting:
+            self.reconnects += 1
+        self._bot = bot
+        self.api = bot.api
+        self.state = STATE_CONNECTED
+        self._ready.set()
+        logger.info(f"已连接QQ机器人，用时 {self.connect_seconds:.2f} 秒")
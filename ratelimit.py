@@ -0,0 +1,56 @@
+"""
+令牌桶限速器
+用于控制向每个QQ群发送消息的速率，避免触发 NapCat / QQ 的频率限制或风控。
+"""
+
+import asyncio
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        """
+        初始化令牌桶
+
+        Args:
+            rate (float): 每秒补充的令牌数量，即长期平均发送速率
+            capacity (float): 桶容量，即允许的最大突发数量
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens=1):
+        """
+        尝试取出令牌，不等待
+
+        Returns:
+            bool: 是否取到令牌
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    def time_until_available(self, tokens=1):
+        """
+        距离有足够令牌还需要等待的时间（秒）
+        """
+        self._refill()
+        if self._tokens >= tokens:
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    async def acquire(self, tokens=1):
+        """
+        等待直到取到令牌
+        """
+        while not self.try_acquire(tokens):
+            await asyncio.sleep(self.time_until_available(tokens))
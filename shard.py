@@ -0,0 +1,623 @@
+"""
+分片模式
+监听的群组分给多个监听进程，每个进程使用自己的Telegram会话（可以是不同的账号），
+只负责接收、过滤和格式化消息；格式化好的消息经本地TCP连接（每行一条JSON）交给转发进程，
+由转发进程统一去重、写入消息输出和发件箱，并通过唯一的QQ机器人连接发送。
+转发进程同时负责启动和监督监听进程：进程退出时把它的群组重新分给其他进程并从检查点补拉，
+进程重启后再分回一部分群组；各分片的连接健康状态和吞吐量汇总到日志和指标中。
+
+用法:
+    python shard.py --login telegram_session_2   # 第一次使用某个会话时先登录
+    python shard.py                               # 按 config.py 中的 SHARD_SESSIONS 启动
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+from datetime import datetime
+
+from delivery import Handoff
+
+logger = logging.getLogger(__name__)
+
+# 监听进程状态
+SHARD_STARTING = "starting"
+SHARD_RUNNING = "running"
+SHARD_DEAD = "dead"
+
+# 单行消息的长度上限，超长的消息文本会被截断
+LINE_LIMIT = 16 * 1024 * 1024
+
+# 转发进程每次运行生成一个口令，通过环境变量传给监听进程，本机的其他进程无法冒充监听进程
+TOKEN_ENV = "TGFORWARD_SHARD_TOKEN"
+
+
+def encode_handoff(handoff):
+    """
+    序列化交给转发进程的消息（不包括只能在同一进程内传递的媒体）
+    """
+    return {
+        "type": "message",
+        "chat_id": handoff.chat_id,
+        "message_id": handoff.message_id,
+        "text": handoff.text,
+        "record": handoff.record,
+        "targets": handoff.targets,
+        "edit_date": handoff.edit_date.isoformat() if handoff.edit_date else None,
+        "is_edited": handoff.is_edited,
+        "dedup_keys": handoff.dedup_keys,
+        "message_key": handoff.message_key,
+    }
+
+
+def decode_handoff(data):
+    return Handoff(
+        chat_id=data["chat_id"],
+        message_id=data["message_id"],
+        text=data["text"],
+        record=data["record"],
+        targets=data["targets"],
+        edit_date=datetime.fromisoformat(data["edit_date"]) if data["edit_date"] else None,
+        is_edited=data["is_edited"],
+        dedup_keys=data["dedup_keys"],
+        message_key=data["message_key"],
+    )
+
+
+async def send_line(writer, data):
+    writer.write(json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+    await writer.drain()
+
+
+def balance(groups, assignment, shards):
+    """
+    把群组分配给存活的分片，尽量保持原来的分配，只移动必要的群组
+
+    Args:
+        groups: 所有需要监听的群组ID
+        assignment (dict): 分片名 -> 当前分配的群组ID集合
+        shards: 存活的分片名
+
+    Returns:
+        dict: 分片名 -> 新的群组ID集合
+    """
+    shards = list(shards)
+    if not shards:
+        return {}
+    groups = set(groups)
+    result = {shard: set(assignment.get(shard, ())) & groups for shard in shards}
+    assigned = set().union(*result.values())
+
+    def load(shard):
+        return len(result[shard]), shard
+
+    # 没有分配的群组（新增的，或原来的分片已退出）分给负载最小的分片
+    for group_id in sorted(groups - assigned):
+        result[min(shards, key=load)].add(group_id)
+    # 负载相差超过1时从最多的分片移动群组到最少的分片
+    while True:
+        most = max(shards, key=load)
+        least = min(shards, key=load)
+        if len(result[most]) - len(result[least]) <= 1:
+            return result
+        group_id = max(result[most])
+        result[most].remove(group_id)
+        result[least].add(group_id)
+
+
+class ShardState:
+    """
+    转发进程记录的一个监听进程的状态
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = SHARD_DEAD
+        self.process = None
+        self.writer = None
+        self.groups = set()
+        self.started_at = None
+        self.restarts = 0
+        self.restart_delay = 0
+        self.messages = 0          # 收到的消息数量
+        self.health = {}           # 监听进程上报的连接健康状态
+        self.reported_at = None
+        self._last_messages = 0
+        self.rate = 0.0            # 最近一个统计周期的消息速率（条/秒）
+
+
+class ShardHub:
+    def __init__(self, monitor, sessions, monitor_groups, qq_routes=None, host="127.0.0.1", port=9110,
+                 restart_delay=5, restart_delay_max=300, report_interval=60):
+        """
+        初始化转发进程
+
+        Args:
+            monitor (TelegramMonitor): 负责转发的监控器，不连接Telegram，只使用 deliver 及其转发队列、发件箱和消息输出
+            sessions (list): 每个监听进程使用的Telegram会话名
+            monitor_groups (dict): 群组ID -> 用户ID字符串，格式同 MONITOR_GROUPS
+            qq_routes (dict): 群组ID -> 目标QQ群，格式同 QQ_ROUTES，用于检查监听进程发来的消息的目标
+            host (str): 本地连接的监听地址
+            port (int): 本地连接的端口
+            restart_delay (float): 监听进程退出后第一次重启前等待的时间（秒）
+            restart_delay_max (float): 反复退出时重启间隔的上限（秒）
+            report_interval (float): 输出各分片统计日志的间隔（秒）
+        """
+        self.monitor = monitor
+        self.monitor_groups = {int(group_id): str(users or "") for group_id, users in monitor_groups.items()}
+        self.host = host
+        self.port = port
+        self.restart_delay = restart_delay
+        self.restart_delay_max = restart_delay_max
+        self.report_interval = report_interval
+        self.shards = {name: ShardState(name) for name in sessions}
+        self.token = secrets.token_hex(16)
+        # 每个群组允许发往的QQ群，只按配置检查，监听进程发来的目标不可信
+        qq_routes = {int(group_id): targets for group_id, targets in (qq_routes or {}).items()}
+        self._allowed_targets = {
+            group_id: frozenset(target for target, _ in monitor.parse_targets(qq_routes.get(group_id)))
+            for group_id in self.monitor_groups
+        }
+
+        self._server = None
+        self._tasks = []
+        self._stopping = False
+        self._floors = {}  # 群组ID -> 监听进程上报的补拉起点（之前的消息都已处理），群组换到其他分片时从这里补拉
+        self._last_report = time.monotonic()
+
+        # 统计
+        self.rebalances = 0
+        self.errors = 0
+        self.rejected = 0
+
+    async def start(self):
+        """
+        启动本地连接端口和所有监听进程
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=LINE_LIMIT)
+        logger.info(f"分片转发端口已启动: {self.host}:{self.port}，监听进程 {len(self.shards)} 个，群组 {len(self.monitor_groups)} 个")
+        for shard in self.shards.values():
+            self._tasks.append(asyncio.create_task(self._supervise(shard)))
+        if self.report_interval:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+
+    async def stop(self):
+        """
+        停止所有监听进程和本地连接端口
+        """
+        self._stopping = True
+        for shard in self.shards.values():
+            if shard.process is not None and shard.process.returncode is None:
+                shard.process.terminate()
+        for shard in self.shards.values():
+            if shard.process is not None:
+                try:
+                    await asyncio.wait_for(shard.process.wait(), timeout=10)
+                except asyncio.TimeoutError:
+                    shard.process.kill()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        logger.info(f"分片统计: {self.get_stats()}")
+
+    def get_stats(self):
+        """
+        获取各分片的统计信息
+        """
+        return {
+            "rebalances": self.rebalances,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "shards": {
+                shard.name: {
+                    "state": shard.state,
+                    "groups": len(shard.groups),
+                    "messages": shard.messages,
+                    "rate": round(shard.rate, 2),
+                    "restarts": shard.restarts,
+                    "telegram": shard.health.get("state"),
+                    "rtt_ms": shard.health.get("rtt_ms"),
+                    "last_update_age_s": shard.health.get("last_update_age_s"),
+                }
+                for shard in self.shards.values()
+            },
+        }
+
+    def _spawn_args(self, shard):
+        return [sys.executable, os.path.abspath(__file__), "--worker", shard.name,
+                "--host", self.host, "--port", str(self.port)]
+
+    async def _supervise(self, shard):
+        """
+        启动监听进程，进程退出后把它的群组分给其他进程，并按指数退避重启
+        """
+        while not self._stopping:
+            shard.state = SHARD_STARTING
+            shard.started_at = time.monotonic()
+            shard.process = await asyncio.create_subprocess_exec(
+                *self._spawn_args(shard), env={**os.environ, TOKEN_ENV: self.token}
+            )
+            logger.info(f"监听进程 {shard.name} 已启动 (pid {shard.process.pid})")
+            code = await shard.process.wait()
+            if self._stopping:
+                return
+            shard.state = SHARD_DEAD
+            shard.writer = None
+            shard.health = {}
+            shard.restarts += 1
+            logger.warning(f"监听进程 {shard.name} 已退出 (返回值 {code})，重新分配它的 {len(shard.groups)} 个群组")
+            await self._rebalance()
+
+            # 运行了一段时间才退出的进程立即重启，启动后很快退出的进程逐渐延长等待时间
+            if time.monotonic() - shard.started_at > self.restart_delay_max:
+                shard.restart_delay = 0
+            shard.restart_delay = min(max(shard.restart_delay * 2, self.restart_delay), self.restart_delay_max)
+            logger.info(f"{shard.restart_delay} 秒后重启监听进程 {shard.name}")
+            await asyncio.sleep(shard.restart_delay)
+
+    async def _rebalance(self):
+        """
+        按存活的分片重新分配群组，并通知分配有变化的分片
+        先通知失去群组的分片，再通知得到群组的分片，尽量避免两个分片同时监听同一个群组
+
+        Returns:
+            list: 已通知的分片名
+        """
+        running = [shard.name for shard in self.shards.values() if shard.state == SHARD_RUNNING]
+        old = {name: set(shard.groups) for name, shard in self.shards.items()}
+        new = balance(self.monitor_groups, old, running)
+        for name, shard in self.shards.items():
+            shard.groups = new.get(name, set())
+        changed = [name for name in running if new[name] != old[name]]
+        if changed:
+            self.rebalances += 1
+        changed.sort(key=lambda name: not (old[name] - new[name]))
+        for name in changed:
+            await self._assign(self.shards[name])
+        return changed
+
+    async def _assign(self, shard):
+        if shard.writer is None:
+            return
+        groups = {str(group_id): self.monitor_groups[group_id] for group_id in sorted(shard.groups)}
+        checkpoints = {str(group_id): self._floors[group_id] for group_id in shard.groups if group_id in self._floors}
+        logger.info(f"分配给监听进程 {shard.name} 的群组: {sorted(shard.groups)}")
+        try:
+            await send_line(shard.writer, {"type": "assign", "groups": groups, "checkpoints": checkpoints})
+        except (ConnectionError, OSError) as e:
+            logger.warning(f"通知监听进程 {shard.name} 时出错: {e}")
+
+    async def _handle(self, reader, writer):
+        """
+        处理一个监听进程的连接：先收到 hello，之后是格式化好的消息和定期上报的统计
+        """
+        shard = None
+        try:
+            hello = json.loads(await reader.readline() or b"null")
+            if not isinstance(hello, dict) or hello.get("type") != "hello" or hello.get("shard") not in self.shards:
+                logger.warning(f"未知的分片连接: {writer.get_extra_info('peername')}")
+                return
+            if not hmac.compare_digest(str(hello.get("token") or ""), self.token):
+                logger.warning(f"拒绝口令错误的分片连接 {hello['shard']}: {writer.get_extra_info('peername')}")
+                return
+            shard = self.shards[hello["shard"]]
+            shard.writer = writer
+            shard.state = SHARD_RUNNING
+            logger.info(f"监听进程 {shard.name} 已连接，启动用时 {time.monotonic() - shard.started_at:.2f} 秒")
+            # 分配没有变化时（例如只有一个分片）也需要告诉它要监听哪些群组
+            if shard.name not in await self._rebalance():
+                await self._assign(shard)
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                data = json.loads(line)
+                kind = data.get("type")
+                if kind == "message":
+                    await self._deliver(shard, decode_handoff(data))
+                elif kind == "stats":
+                    shard.health = data.get("health") or {}
+                    shard.reported_at = time.monotonic()
+                    for group_id, message_id in (data.get("checkpoints") or {}).items():
+                        self._advance(int(group_id), message_id)
+        except (ConnectionError, ValueError, asyncio.LimitOverrunError) as e:
+            logger.warning(f"分片连接出错: {e}")
+        finally:
+            if shard is not None and shard.writer is writer:
+                shard.writer = None
+            writer.close()
+
+    async def _deliver(self, shard, handoff):
+        allowed = self._allowed_targets.get(handoff.chat_id)
+        if allowed is None or not handoff.targets or not set(handoff.targets) <= allowed:
+            self.rejected += 1
+            logger.warning(f"拒绝分片 {shard.name} 发来的消息: 群组 {handoff.chat_id} 不能发往 {handoff.targets}")
+            return
+        # 实时消息的ID之前可能还有没补拉的缺口，补拉起点只按监听进程上报的值推进
+        shard.messages += 1
+        try:
+            await self.monitor.deliver(handoff)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"转发分片 {shard.name} 的消息时出错: {e}")
+
+    def _advance(self, group_id, message_id):
+        if message_id > self._floors.get(group_id, 0):
+            self._floors[group_id] = message_id
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.monotonic()
+            elapsed = now - self._last_report
+            self._last_report = now
+            for shard in self.shards.values():
+                shard.rate = (shard.messages - shard._last_messages) / elapsed if elapsed else 0.0
+                shard._last_messages = shard.messages
+            logger.info(f"分片统计: {self.get_stats()}")
+
+
+class ShardClient:
+    def __init__(self, monitor, name, host="127.0.0.1", port=9110, token="", report_interval=10):
+        """
+        初始化监听进程与转发进程之间的连接
+
+        Args:
+            monitor (TelegramMonitor): 监听进程中的监控器
+            name (str): 分片名（Telegram会话名）
+            host (str): 转发进程的地址
+            port (int): 转发进程的端口
+            token (str): 转发进程通过环境变量传入的口令
+            report_interval (float): 上报统计的间隔（秒）
+        """
+        self.monitor = monitor
+        self.name = name
+        self.host = host
+        self.port = port
+        self.token = token
+        self.report_interval = report_interval
+        self.groups = {}
+        self.checkpoints = {}
+        self.assigned = asyncio.Event()
+        self.closed = asyncio.Event()
+        self._reader = None
+        self._writer = None
+        self._tasks = []
+        self._monitoring = False
+        self._update_lock = asyncio.Lock()
+
+        # 统计
+        self.sent = 0
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=LINE_LIMIT)
+        await send_line(self._writer, {"type": "hello", "shard": self.name, "token": self.token, "pid": os.getpid()})
+        self._tasks.append(asyncio.create_task(self._read_loop()))
+        if self.report_interval:
+            self._tasks.append(asyncio.create_task(self._report_loop()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    async def send_handoff(self, handoff):
+        """
+        把格式化好的消息发给转发进程；转发进程处理不过来时在这里等待，反压到Telegram事件回调
+        """
+        if self._writer is None or self.closed.is_set():
+            raise ConnectionError("与转发进程的连接已断开")
+        await send_line(self._writer, encode_handoff(handoff))
+        self.sent += 1
+
+    def start_monitoring(self):
+        """
+        开始监听后调用，之后收到的群组分配立即生效
+        """
+        self._monitoring = True
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                data = json.loads(line)
+                if data.get("type") != "assign":
+                    continue
+                self.groups = {int(group_id): users for group_id, users in data["groups"].items()}
+                self.checkpoints = {int(group_id): message_id for group_id, message_id in data["checkpoints"].items()}
+                self.assigned.set()
+                if self._monitoring:
+                    async with self._update_lock:
+                        await self.monitor.update_groups(self.groups, self.checkpoints)
+        except (ConnectionError, ValueError) as e:
+            logger.error(f"与转发进程的连接出错: {e}")
+        finally:
+            logger.warning("与转发进程的连接已断开")
+            self.closed.set()
+
+    async def _report_loop(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            monitor = self.monitor
+            # 上报补拉起点而不是最大消息ID，群组换到其他分片时不会跳过还没补拉的缺口
+            checkpoints = {
+                str(group_id): monitor.checkpoints.floor(group_id)
+                for group_id in monitor.routes
+                if monitor.checkpoints.floor(group_id) is not None
+            }
+            try:
+                await send_line(self._writer, {
+                    "type": "stats",
+                    "sent": self.sent,
+                    "health": monitor.health.get_stats(),
+                    "checkpoints": checkpoints,
+                })
+            except (ConnectionError, OSError):
+                return
+
+
+def configure_worker(main, name):
+    """
+    监听进程只接收和格式化消息：使用自己的会话、检查点和群组快照，
+    不写消息输出和发件箱，不开启指标端口，也不转发媒体文件（媒体只能在同一进程内交给QQ）
+    """
+    main.SESSION_NAME = name
+    main.CHECKPOINT_PATH = f"checkpoints_{name}.json"
+    main.ENTITY_SNAPSHOT_PATH = f"entity_snapshot_{name}.json"
+    main.OUTBOX_PATH = ""
+    main.OUTPUT_JSONL_PATH = ""
+    main.OUTPUT_STDOUT_PRETTY = False
+    main.ARCHIVE_DIR = ""
+    main.METRICS_PORT = 0
+    main.MEDIA_FORWARD = False
+
+
+async def run_worker(name, host, port):
+    """
+    监听进程：连接转发进程，登录Telegram，按分配的群组监听，直到与转发进程的连接断开
+    """
+    import main
+    configure_worker(main, name)
+    monitor = main.TelegramMonitor()
+    client = ShardClient(monitor, name, host, port, token=os.environ.get(TOKEN_ENV, ""))
+    monitor.shard_client = client
+    started = time.perf_counter()
+    await client.connect()
+    monitoring = None
+    try:
+        await monitor.start_client()
+        logger.info(f"监听进程 {name} 的Telegram客户端启动用时 {time.perf_counter() - started:.2f} 秒")
+        # 群组数量少于分片数量时，有的分片暂时没有群组，等待重新分配
+        while not client.groups and not client.closed.is_set():
+            client.assigned.clear()
+            await asyncio.wait(
+                [asyncio.create_task(client.assigned.wait()), asyncio.create_task(client.closed.wait())],
+                return_when=asyncio.FIRST_COMPLETED
+            )
+        if client.closed.is_set():
+            return
+        monitor.load_monitor_config(client.groups)
+        client.start_monitoring()
+        monitoring = asyncio.create_task(monitor.monitor_groups_messages(checkpoints=client.checkpoints))
+        closed = asyncio.create_task(client.closed.wait())
+        await asyncio.wait([monitoring, closed], return_when=asyncio.FIRST_COMPLETED)
+        closed.cancel()
+    finally:
+        if monitoring is not None and not monitoring.done():
+            monitoring.cancel()
+            await asyncio.gather(monitoring, return_exceptions=True)
+        await client.close()
+        await monitor.client.disconnect()
+
+
+async def run_supervisor():
+    """
+    转发进程：启动QQ转发和监听进程，直到被中断
+    """
+    import main
+    from config import MONITOR_GROUPS, QQ_ROUTES, SHARD_SESSIONS, SHARD_HOST, SHARD_PORT
+    from config import SHARD_RESTART_DELAY_MAX, SHARD_REPORT_INTERVAL
+    if not MONITOR_GROUPS or not SHARD_SESSIONS:
+        logger.error("分片模式需要在 config.py 中配置 MONITOR_GROUPS 和 SHARD_SESSIONS")
+        return
+
+    # 转发进程不连接Telegram，使用内存会话，不会占用监听进程的会话文件；媒体文件不经过转发进程
+    main.SESSION_NAME = None
+    main.MEDIA_FORWARD = False
+    monitor = main.TelegramMonitor()
+    hub = ShardHub(
+        monitor, SHARD_SESSIONS, MONITOR_GROUPS, qq_routes=QQ_ROUTES, host=SHARD_HOST, port=SHARD_PORT,
+        restart_delay_max=SHARD_RESTART_DELAY_MAX, report_interval=SHARD_REPORT_INTERVAL
+    )
+    monitor.metrics.gauge("shard_up", "监听进程是否已连接",
+                          lambda: {(s.name,): int(s.state == SHARD_RUNNING) for s in hub.shards.values()},
+                          labelnames=("shard",))
+    monitor.metrics.gauge("shard_groups", "分配给监听进程的群组数量",
+                          lambda: {(s.name,): len(s.groups) for s in hub.shards.values()}, labelnames=("shard",))
+    monitor.metrics.counter_func("shard_messages_total", "监听进程交给转发进程的消息数量",
+                                 lambda: {(s.name,): s.messages for s in hub.shards.values()}, labelnames=("shard",))
+    monitor.metrics.counter_func("shard_restarts_total", "监听进程退出后重启的次数",
+                                 lambda: {(s.name,): s.restarts for s in hub.shards.values()}, labelnames=("shard",))
+    monitor.metrics.gauge("shard_telegram_rtt_seconds", "监听进程最近一次探测Telegram的往返时间",
+                          lambda: {
+                              (s.name,): s.health["rtt_ms"] / 1000
+                              for s in hub.shards.values() if s.health.get("rtt_ms") is not None
+                          }, labelnames=("shard",))
+
+    started = time.perf_counter()
+    monitor.qq.start()
+    monitor.start_delivery()
+    if monitor.outbox is not None:
+        await monitor.outbox.start()
+    for sink in monitor.sinks:
+        sink.start()
+    await monitor.metrics.start(main.METRICS_HOST, main.METRICS_PORT, log_interval=main.METRICS_LOG_INTERVAL)
+    try:
+        await hub.start()
+        logger.info(f"转发进程启动用时 {time.perf_counter() - started:.2f} 秒")
+        await asyncio.Event().wait()
+    finally:
+        await hub.stop()
+        await monitor.stop_delivery()
+        if monitor.outbox is not None:
+            await monitor.outbox.stop()
+        for sink in monitor.sinks:
+            await sink.stop()
+            logger.info(f"消息输出 {sink.name} 统计: {sink.get_stats()}")
+        await monitor.metrics.stop()
+        await monitor.qq.stop()
+        if monitor.dedup is not None:
+            logger.info(f"去重统计: {monitor.dedup.get_stats()}")
+
+
+async def login(name):
+    """
+    交互式登录一个会话，之后监听进程可以直接使用
+    """
+    import main
+    main.SESSION_NAME = name
+    monitor = main.TelegramMonitor()
+    try:
+        await monitor.start_client()
+    finally:
+        await monitor.client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片模式：多个Telegram会话分担监听的群组，由一个进程统一转发到QQ")
+    parser.add_argument("--login", metavar="SESSION", help="登录指定的会话后退出")
+    parser.add_argument("--worker", metavar="SESSION", help=argparse.SUPPRESS)
+    parser.add_argument("--host", default="127.0.0.1", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, default=9110, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    try:
+        if args.login:
+            asyncio.run(login(args.login))
+        elif args.worker:
+            asyncio.run(run_worker(args.worker, args.host, args.port))
+        else:
+            asyncio.run(run_supervisor())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
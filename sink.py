@@ -0,0 +1,226 @@
+"""
+消息输出
+转发的每条消息除了发送到QQ，还会以结构化记录写入输出端。
+记录先放入有界缓冲区，由后台协程按批次交给单独的线程序列化并写入，
+事件回调中只做一次入队操作，不会因为磁盘或被重定向的标准输出变慢而阻塞事件循环。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from delivery import OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_POLICIES
+
+logger = logging.getLogger(__name__)
+
+
+class MessageSink:
+    """
+    输出端基类，子类实现 _write_batch 即可接入
+
+    _write_batch 在单独的线程中执行，参数为一批记录（dict），可以进行阻塞的IO操作
+    """
+    name = "sink"
+
+    def __init__(self, maxsize=10000, overflow_policy=OVERFLOW_DROP_OLDEST, flush_interval=1, batch_size=500):
+        """
+        初始化输出端
+
+        Args:
+            maxsize (int): 缓冲区最多容纳的记录数量
+            overflow_policy (str): 缓冲区满时的处理策略，取值同转发队列
+            flush_interval (float): 两次批量写入之间的最长间隔（秒）
+            batch_size (int): 缓冲区达到该数量时立即写入
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"未知的溢出策略: {overflow_policy}")
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.name)
+        self._queue = None
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+
+        # 统计
+        self.written = 0
+        self.dropped = 0
+        self.batches = 0
+        self.errors = 0
+        self._dropped_reported = 0
+
+    def start(self):
+        """
+        启动后台写入协程，必须在事件循环中调用
+        """
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.maxsize)
+            self._wakeup = asyncio.Event()
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """
+        写完缓冲区中剩余的记录后停止
+        """
+        if self._task is None:
+            return
+        # 不取消写入协程，让它写完最后一批后自行退出
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+        self._task = None
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+    async def put(self, record):
+        """
+        放入一条记录，除 block 策略外不会等待
+
+        Returns:
+            bool: 记录是否成功放入缓冲区
+        """
+        queue = self._queue
+        if queue is None:
+            return False
+        if queue.full():
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                self.dropped += 1
+                return False
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                try:
+                    queue.get_nowait()
+                    self.dropped += 1
+                except asyncio.QueueEmpty:
+                    pass
+        await queue.put(record)
+        if queue.qsize() >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    def get_stats(self):
+        """
+        获取输出统计信息
+        """
+        return {
+            "buffered": self._queue.qsize() if self._queue is not None else 0,
+            "written": self.written,
+            "dropped": self.dropped,
+            "batches": self.batches,
+            "errors": self.errors,
+        }
+
+    def _write_batch(self, records):
+        raise NotImplementedError
+
+    def _close(self):
+        """
+        停止时在写入线程中调用，用于关闭文件等资源
+        """
+
+    def _drain(self):
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except asyncio.QueueEmpty:
+                return batch
+
+    async def _flush(self, batch):
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._write_batch, batch)
+            self.written += len(batch)
+            self.batches += 1
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"写入消息输出 {self.name} 时出错，丢弃 {len(batch)} 条记录: {e}")
+
+    async def _run(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            batch = self._drain()
+            if batch:
+                await self._flush(batch)
+            if self.dropped != self._dropped_reported:
+                logger.warning(f"消息输出 {self.name} 缓冲区已满，共丢弃 {self.dropped} 条记录")
+                self._dropped_reported = self.dropped
+
+
+class JsonlFileSink(MessageSink):
+    """
+    以每行一条紧凑JSON的格式写入文件，文件超过指定大小时轮转
+    """
+    name = "jsonl"
+
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=5, **kwargs):
+        """
+        Args:
+            path (str): 输出文件路径
+            max_bytes (int): 单个文件的最大字节数，超过后轮转为 path.1、path.2 ...，0表示不轮转
+            backup_count (int): 保留的历史文件数量
+        """
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._file = None
+
+    def _write_batch(self, records):
+        data = "".join(
+            json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records
+        ).encode("utf-8")
+        if self._file is None:
+            self._file = open(self.path, "ab")
+        if self.max_bytes and self._file.tell() and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        if self.backup_count:
+            for i in range(self.backup_count - 1, 0, -1):
+                src = f"{self.path}.{i}"
+                if os.path.exists(src):
+                    os.replace(src, f"{self.path}.{i + 1}")
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, "ab")
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class StdoutSink(MessageSink):
+    """
+    打印到标准输出，适合在终端中直接查看
+    """
+    name = "stdout"
+
+    def __init__(self, pretty=True, **kwargs):
+        """
+        Args:
+            pretty (bool): 是否以缩进的格式打印
+        """
+        super().__init__(**kwargs)
+        self.pretty = pretty
+
+    def _write_batch(self, records):
+        indent = 2 if self.pretty else None
+        separators = None if self.pretty else (",", ":")
+        sys.stdout.write("".join(
+            json.dumps(record, ensure_ascii=False, indent=indent, separators=separators) + "\n" for record in records
+        ))
+        sys.stdout.flush()
@@ -0,0 +1,114 @@
+"""
+群组实体快照
+把已解析的群组信息（类型、原始ID、access_hash、名称）保存到本地文件，
+重启后无需任何网络请求即可构造 InputPeer 和显示群组名称。
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from telethon.tl.types import Chat, Channel, InputPeerChannel, InputPeerChat
+
+logger = logging.getLogger(__name__)
+
+
+class EntitySnapshot:
+    def __init__(self, path):
+        """
+        初始化实体快照
+
+        Args:
+            path (str): 快照文件路径（JSON）
+        """
+        self.path = path
+        self._entries = {}  # 群组ID -> 快照信息
+        self._version = 0   # 每次有变化时加1，写入期间又有变化时写入后仍保持 dirty
+        self.dirty = False
+
+    def load(self):
+        """
+        从文件加载快照，文件不存在时为空
+        """
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = {int(group_id): entry for group_id, entry in data.items()}
+        except FileNotFoundError:
+            self._entries = {}
+        except (ValueError, OSError) as e:
+            logger.warning(f"读取实体快照失败，将重新解析群组: {e}")
+            self._entries = {}
+        self.dirty = False
+
+    def save(self):
+        """
+        写入快照文件（先写临时文件再替换），写入成功后才清除 dirty 标记
+        """
+        version, data = self._version, self._copy()
+        self._write(data)
+        self._mark_saved(version)
+
+    async def save_async(self):
+        """
+        在线程中写入快照文件；要写入的数据在事件循环线程中复制，写入线程不会读到正在修改的字典
+        """
+        version, data = self._version, self._copy()
+        await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+        self._mark_saved(version)
+
+    def _copy(self):
+        # 每个群组的快照信息更新时整体替换，复制外层字典即可
+        return {str(group_id): entry for group_id, entry in self._entries.items()}
+
+    def _write(self, data):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _mark_saved(self, version):
+        if version == self._version:
+            self.dirty = False
+
+    def update(self, group_id, entity):
+        """
+        根据解析得到的实体更新快照
+        """
+        if isinstance(entity, Channel):
+            entry = {"type": "channel", "id": entity.id, "access_hash": entity.access_hash}
+        elif isinstance(entity, Chat):
+            entry = {"type": "chat", "id": entity.id, "access_hash": None}
+        else:
+            return
+        entry["title"] = entity.title
+
+        old = self._entries.get(group_id)
+        entry["updated_at"] = time.time()
+        self._entries[group_id] = entry
+        if old is None or any(old.get(k) != entry[k] for k in ("type", "id", "access_hash", "title")):
+            self._version += 1
+            self.dirty = True
+
+    def title(self, group_id):
+        entry = self._entries.get(group_id)
+        return entry["title"] if entry else None
+
+    def input_peer(self, group_id):
+        """
+        由快照构造 InputPeer，没有快照时返回None
+        """
+        entry = self._entries.get(group_id)
+        if entry is None:
+            return None
+        if entry["type"] == "channel":
+            return InputPeerChannel(entry["id"], entry["access_hash"])
+        return InputPeerChat(entry["id"])
+
+    def stalest(self, group_ids):
+        """
+        返回给定群组中最久没有刷新的一个
+        """
+        return min(group_ids, key=lambda g: self._entries.get(g, {}).get("updated_at", 0), default=None)